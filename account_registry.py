@@ -0,0 +1,109 @@
+"""In-process registry of contestant accounts backed by the leaderboard table.
+
+Credentials, breach state and starting day balance come from one query. After
+the first load only rows touched since the last refresh are re-read, through
+the index on last_update_time. Removed contestants are dropped by the full
+reload that happens every FULL_REFRESH_INTERVAL.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+from records import Account
+
+# Seconds between unconditional full reloads of the registry
+FULL_REFRESH_INTERVAL = int(os.getenv("REGISTRY_FULL_REFRESH_INTERVAL", "1800"))
+
+ACCOUNT_COLUMNS = ["account_id", "server", "password", "contestant_name", "breached", "starting_day_balance", "last_update_time"]
+
+
+class AccountRegistry:
+    def __init__(self, pool, full_refresh_interval=None):
+        self.pool = pool
+        self.full_refresh_interval = full_refresh_interval if full_refresh_interval is not None else FULL_REFRESH_INTERVAL
+        self.accounts = {}
+        self.watermark = None
+        self.last_full_refresh = None
+        self.warm = False  # accounts come from a warm-start snapshot, not the database
+
+    def seed(self, accounts):
+        """Start from previously saved accounts until the first refresh replaces them"""
+        self.accounts = dict(accounts)
+        self.warm = True
+
+    def refresh(self):
+        """Bring the registry up to date, returns the number of rows read"""
+        if self.last_full_refresh is None or time.monotonic() - self.last_full_refresh >= self.full_refresh_interval:
+            return self._full_refresh()
+
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {", ".join(ACCOUNT_COLUMNS)} FROM leaderboard
+                    WHERE last_update_time IS NULL OR last_update_time >= %s
+                """, (self.watermark or datetime.min,))
+                changed = cur.fetchall()
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+
+        added = [row for row in changed if str(row[0]) not in self.accounts]
+        self._merge(changed)
+        if added:
+            logging.info(f"Account registry picked up {len(added)} new accounts")
+        return len(changed)
+
+    def _full_refresh(self):
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {', '.join(ACCOUNT_COLUMNS)} FROM leaderboard")
+                rows = cur.fetchall()
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+
+        previous = set(self.accounts)
+        self.accounts = {}
+        self.watermark = None
+        self._merge(rows)
+        self.last_full_refresh = time.monotonic()
+        self.warm = False
+        removed = previous - set(self.accounts)
+        if removed:
+            logging.info(f"Account registry dropped {len(removed)} removed accounts")
+        logging.info(f"Account registry loaded {len(self.accounts)} accounts")
+        return len(rows)
+
+    def _merge(self, rows):
+        for account_id, server, password, contestant_name, breached, starting_day_balance, updated in rows:
+            account = Account(
+                str(account_id),
+                server,
+                password,
+                contestant_name,
+                bool(breached),
+                float(starting_day_balance) if starting_day_balance is not None else None,
+            )
+            self.accounts[account.account_id] = account
+            if updated is not None and (self.watermark is None or updated > self.watermark):
+                self.watermark = updated
+
+    def record_results(self, account_data_list):
+        """Apply this process's own writes so they're visible before the next refresh"""
+        for data in account_data_list:
+            account = self.accounts.get(str(data.account_id))
+            if account:
+                account.breached = account.breached or data.breached
+                account.starting_day_balance = data.starting_day_balance
+
+    def active_accounts(self):
+        return [account for account in self.accounts.values() if not account.breached]
+
+    def breached_accounts(self):
+        return [account for account in self.accounts.values() if account.breached]
+
+    def starting_day_balance(self, account_id):
+        account = self.accounts.get(str(account_id))
+        return account.starting_day_balance if account else None
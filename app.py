@@ -1,16 +1,33 @@
-import MetaTrader5 as mt5
 import json
 import logging
+import os
 from datetime import datetime, timedelta
 import time
-import threading
 import traceback
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import psycopg2.pool
+from psycopg2.extras import RealDictCursor, execute_values
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-
-# Database configuration
+from account_registry import AccountRegistry
+from db_pool import ManagedConnectionPool
+from instrumentation import phase
+import instrumentation
+from deal_aggregates import DealAggregate
+from equity_store import EquityStore
+from rankings import RankingBoard
+from breach_events import BreachEventSink
+import read_api
+from mt5_pool import MT5WorkerPool
+from pipeline import run_pipeline
+from symbol_stats import GlobalSymbolStats
+from scheduler import PollScheduler, TICK_SECONDS
+from shard_leases import ShardLeases, shard_of
+from warm_start import load_snapshot, save_snapshot
+from result_spool import ResultSpool, RESULT_SPOOL_PATH
+
+# Database configuration; LEADERBOARD_DB_DSN points the service at another
+# database (e.g. a local Postgres for benchmarks) instead
 DB_CONFIG = {
     'host': 'aws-0-ap-south-1.pooler.supabase.com',
     'port': 5432,
@@ -24,6 +41,8 @@ DB_CONFIG = {
     'keepalives_interval': 10,
     'keepalives_count': 5
 }
+if os.getenv("LEADERBOARD_DB_DSN"):
+    DB_CONFIG = {'dsn': os.getenv("LEADERBOARD_DB_DSN")}
 
 # Setup logging
 logging.basicConfig(
@@ -35,20 +54,12 @@ logging.basicConfig(
     ]
 )
 
-class DatabasePool:
-    def __init__(self):
-        self.pool = None
-
-    def __enter__(self):
-        self.pool = psycopg2.pool.SimpleConnectionPool(5, 20, **DB_CONFIG)  # Increased pool size
-        return self.pool
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.pool:
-            self.pool.closeall()
-
-# Initialize connection pool
-db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, **DB_CONFIG)
+# Initialize connection pool; it lives for the whole process and replaces
+# dead connections on checkout instead of being recreated every cycle.
+# Nothing connects at import: main() opens it during startup, tools on first use
+db_pool = ManagedConnectionPool(1, 10, lazy=True, **DB_CONFIG)
+# Set once the schema exists and the startup loads are done
+database_ready = threading.Event()
 
 def get_db_connection():
     try:
@@ -61,258 +72,170 @@ def return_db_connection(conn):
     if conn:
         db_pool.putconn(conn)
 
-# Get accounts from database
-def fetch_accounts():
+def ensure_schema():
+    """Create the service's own bookkeeping tables if they don't exist yet"""
     conn = None
     try:
         conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT account_id, server, password, contestant_name FROM leaderboard")
-            accounts = cur.fetchall()
-            return [dict(account) for account in accounts]
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS deal_aggregates (
+                    account_id numeric PRIMARY KEY,
+                    last_deal_time bigint NOT NULL DEFAULT 0,
+                    last_deal_ticket bigint NOT NULL DEFAULT 0,
+                    total_lots double precision NOT NULL DEFAULT 0,
+                    deal_count integer NOT NULL DEFAULT 0,
+                    winning_trades integer NOT NULL DEFAULT 0,
+                    losing_trades integer NOT NULL DEFAULT 0,
+                    daily_profits jsonb NOT NULL DEFAULT '{}',
+                    symbol_trade_counts jsonb NOT NULL DEFAULT '{}',
+                    updated_at timestamptz NOT NULL DEFAULT NOW()
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS equity_snapshots (
+                    account_id numeric NOT NULL,
+                    ts timestamp NOT NULL,
+                    equity double precision NOT NULL,
+                    balance double precision NOT NULL,
+                    PRIMARY KEY (account_id, ts)
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS equity_snapshots_ts_idx ON equity_snapshots (ts)")
+            # Lets the registry's incremental refresh read only recently written rows
+            cur.execute("CREATE INDEX IF NOT EXISTS leaderboard_last_update_time_idx ON leaderboard (last_update_time)")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS leaderboard_ranks (
+                    account_id numeric PRIMARY KEY,
+                    contestant_name text,
+                    rank integer NOT NULL,
+                    previous_rank integer,
+                    rank_change integer NOT NULL DEFAULT 0,
+                    day_open_rank integer,
+                    rank_change_today integer NOT NULL DEFAULT 0,
+                    percentile double precision NOT NULL,
+                    return numeric,
+                    balance numeric,
+                    breached boolean,
+                    trading_day timestamp,
+                    updated_at timestamp NOT NULL DEFAULT NOW()
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS leaderboard_ranks_rank_idx ON leaderboard_ranks (rank)")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS breach_events (
+                    id bigserial PRIMARY KEY,
+                    account_id numeric NOT NULL,
+                    breach_type text NOT NULL,
+                    trading_day date NOT NULL,
+                    detected_at timestamp NOT NULL,
+                    contestant_name text,
+                    equity double precision,
+                    limit_value double precision,
+                    details jsonb,
+                    recorded_at timestamp NOT NULL DEFAULT NOW(),
+                    UNIQUE (account_id, breach_type, trading_day)
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS poller_nodes (
+                    node_id text PRIMARY KEY,
+                    heartbeat_at timestamptz NOT NULL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS shard_leases (
+                    shard integer PRIMARY KEY,
+                    node_id text,
+                    expires_at timestamptz
+                )
+            """)
+            # Per-account contributions behind the global symbol counts in most_traded
+            cur.execute("ALTER TABLE metadata ADD COLUMN IF NOT EXISTS symbol_contributions jsonb")
+            conn.commit()
     finally:
         if conn:
             return_db_connection(conn)
 
-def fetch_all_breach_statuses():
-    """Fetch breach status for all accounts in one query"""
+def load_deal_aggregates(account_ids=None):
+    """Load the stored deal cursors and running totals keyed by account id, optionally only these accounts"""
     conn = None
     try:
         conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT account_id, breached FROM leaderboard")
-            return {str(row[0]): row[1] for row in cur.fetchall()}
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT account_id, last_deal_time, last_deal_ticket, total_lots, deal_count,
+                       winning_trades, losing_trades, daily_profits, symbol_trade_counts
+                FROM deal_aggregates
+                WHERE %s::numeric[] IS NULL OR account_id = ANY(%s::numeric[])
+            """, (account_ids, account_ids))
+            return {str(row["account_id"]): DealAggregate.from_row(row) for row in cur.fetchall()}
     finally:
         if conn:
             return_db_connection(conn)
 
-# Constants
-ACCOUNTS = fetch_accounts()
-INITIAL_BALANCE = 100000
-START_DATE = datetime(2025, 3, 1)
-main_running = False
-
-def connect_to_mt5(account):
-    if mt5.initialize(login=int(account["account_id"]), 
-                     server=account["server"], 
-                     password=account["password"]):
-        logging.info(f"Connected to account {account['account_id']}")
-        return True
-    logging.error(f"Failed to connect to account {account['account_id']}: {mt5.last_error()}")
-    return False
-
-def update_starting_day_balance(account_id, new_balance, conn=None):
-    """Dedicated function to update starting day balance with retries"""
-    max_retries = 3
-    retry_delay = 1  # seconds
-    
-    for attempt in range(max_retries):
-        try:
-            should_close_conn = False
-            if conn is None:
-                conn = get_db_connection()
-                should_close_conn = True
-            
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE leaderboard 
-                    SET starting_day_balance = %s,
-                        last_update_time = NOW()
-                    WHERE account_id = %s::numeric
-                    RETURNING account_id, starting_day_balance
-                    """,
-                    (new_balance, str(account_id))
-                )
-                result = cur.fetchone()
-                conn.commit()
-                
-                if result:
-                    logging.info(f"Successfully updated starting day balance for account {account_id}: {new_balance}")
-                    return True
-                else:
-                    logging.warning(f"No rows updated for account {account_id}")
-                    return False
-                    
-        except Exception as e:
-            logging.error(f"Attempt {attempt + 1}/{max_retries} failed to update starting day balance for account {account_id}: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            continue
-        finally:
-            if should_close_conn and conn:
-                return_db_connection(conn)
-                
-    logging.error(f"Failed to update starting day balance for account {account_id} after {max_retries} attempts")
-    return False
-
-def fetch_trading_data(account_id, contestant_name, starting_day_balances):
-    """Modified to accept pre-fetched starting day balances"""
-    try:
-        account_info = mt5.account_info()
-        if not account_info:
-            logging.error(f"Failed to get account info for {account_id}: {mt5.last_error()}")
-            return None
-
-        positions = mt5.positions_get()
-        open_positions_count = len(positions) if positions is not None else 0
-        now = datetime.now()
-        
-        # Use pre-fetched starting day balance with validation
-        starting_day_balance = starting_day_balances.get(str(account_id))
-        if starting_day_balance is None:
-            logging.warning(f"No starting day balance found for account {account_id}, using INITIAL_BALANCE")
-            starting_day_balance = INITIAL_BALANCE
-        
-        # Update starting day balance at 3:30 AM with improved logic
-        if now.hour == 3 and now.minute in range(30, 35):  # Expanded time window slightly
-            new_balance = float(account_info.equity)
-            
-            # Validate the new balance
-            if new_balance > 0:
-                logging.info(f"Attempting to update starting day balance for account {account_id}: {new_balance}")
-                if update_starting_day_balance(account_id, new_balance):
-                    starting_day_balance = new_balance
-                else:
-                    logging.error(f"Failed to update starting day balance for account {account_id}")
-            else:
-                logging.error(f"Invalid new balance value for account {account_id}: {new_balance}")
-
-        # Calculate daily drawdown limit with null check
-        daily_dd_limit = round(float(starting_day_balance) * 0.97, 2) if starting_day_balance is not None else round(INITIAL_BALANCE * 0.97, 2)
-
-        history_deals = mt5.history_deals_get(START_DATE, now)
-        if history_deals is None:
-            logging.error(f"Failed to get history deals for {account_id}: {mt5.last_error()}")
-            history_deals = []
-            
-        # Initialize variables
-        total_lots = 0
-        winning_trades = 0
-        losing_trades = 0
-        total_trades = 0
-        symbol_trade_count = {}
-        filtered_deals = []
-        daily_profits = {}
-
-        if history_deals:
-            # Filter deals where entry == 0
-            filtered_deals = [deal for deal in history_deals if deal is not None]
-
-            if filtered_deals:
-                total_lots = sum(deal.volume for deal in filtered_deals)
-                winning_trades = sum(1 for deal in filtered_deals if deal.profit > 0)
-                losing_trades = sum(1 for deal in filtered_deals if deal.profit < 0)
-                total_trades = len(filtered_deals) // 2
-
-                # Calculate daily profits for consistency score
-                for deal in filtered_deals:
-                    deal_time = datetime.fromtimestamp(deal.time)
-                    day_key = deal_time.strftime('%Y-%m-%d')
-                    daily_profits[day_key] = daily_profits.get(day_key, 0) + deal.profit
-                    
-                    symbol = deal.symbol
-                    symbol_trade_count[symbol] = symbol_trade_count.get(symbol, 0) + 1
-
-        # Calculate consistency score
-        total_profits = sum(daily_profits.values())
-        highest_profit_day = max(daily_profits.values()) if daily_profits else 0
-        consistency_score = round((highest_profit_day / total_profits * 100), 2) if total_profits != 0 else 0
-
-        profit_loss = account_info.balance - INITIAL_BALANCE
-
-        # Calculate average lots traded
-        average_lots = round(total_lots / total_trades, 2) if total_trades > 0 else 0
-
-        # Find most traded symbol and its count
-        most_traded_symbol = max(symbol_trade_count.items(), key=lambda x: x[1], default=(None, 0))
-
-        # Check for breaches
-        breaches = []
-        is_breached = False
-        if daily_dd_limit is not None and account_info.equity < daily_dd_limit:
-            breaches.append({
-                "time": now.isoformat(),
-                "type": "daily_drawdown",
-                "details": {
-                    "account_id": account_id,
-                    "contestant_name": contestant_name,
-                    "equity": account_info.equity,
-                    "daily_dd_limit": daily_dd_limit
-                }
-            })
-            is_breached = True
-        elif account_info.equity < INITIAL_BALANCE * 0.95:
-            breaches.append({
-                "time": now.isoformat(),
-                "type": "max_drawdown",
-                "details": {
-                    "account_id": account_id,
-                    "contestant_name": contestant_name,
-                    "equity": account_info.equity,
-                    "max_drawdown_limit": INITIAL_BALANCE * 0.95
-                }
-            })
-            is_breached = True
-
-        # Set balance equal to equity if breached
-        final_balance = account_info.equity if is_breached else account_info.balance
-
-        return {
-            "account_id": account_id,
-            "contestant_name": contestant_name,
-            "balance": final_balance,  # Using the adjusted balance
-            "equity": account_info.equity,
-            "profit_loss": round(profit_loss, 2),
-            "return": round((profit_loss / INITIAL_BALANCE * 100), 2),
-            "lots_traded": round(total_lots, 2),
-            "average_lots": average_lots,
-            "most_traded_symbol": most_traded_symbol[0],
-            "symbol_trade_counts": symbol_trade_count,  # Add the full trade count dictionary
-            "total_trades": total_trades,
-            "winning_trades": winning_trades,
-            "losing_trades": losing_trades,
-            "win_rate": round((winning_trades / (winning_trades + losing_trades) * 100), 2) if (winning_trades + losing_trades) > 0 else 0,
-            "starting_day_balance": starting_day_balance,
-            "daily_dd_limit": daily_dd_limit,
-            "breaches": breaches,
-            "breached": is_breached,
-            "open_positions": open_positions_count,  # Add open positions count
-            "consistency_score": consistency_score
-        }
-    except Exception as e:
-        logging.error(f"Error processing account {account_id}: {str(e)}")
-        return None
-
-def fetch_breach_status(account_id):
+def upsert_deal_aggregates(cur, aggregates):
+    """Upsert these aggregates on cur; the caller commits"""
+    rows = []
+    for agg in aggregates:
+        row = agg.to_row()
+        rows.append((
+            row["account_id"],
+            row["last_deal_time"],
+            row["last_deal_ticket"],
+            float(row["total_lots"]),
+            row["deal_count"],
+            row["winning_trades"],
+            row["losing_trades"],
+            json.dumps(row["daily_profits"]),
+            json.dumps(row["symbol_trade_counts"]),
+        ))
+    execute_values(cur, """
+        INSERT INTO deal_aggregates (
+            account_id, last_deal_time, last_deal_ticket, total_lots, deal_count,
+            winning_trades, losing_trades, daily_profits, symbol_trade_counts
+        ) VALUES %s
+        ON CONFLICT (account_id) DO UPDATE SET
+            last_deal_time = EXCLUDED.last_deal_time,
+            last_deal_ticket = EXCLUDED.last_deal_ticket,
+            total_lots = EXCLUDED.total_lots,
+            deal_count = EXCLUDED.deal_count,
+            winning_trades = EXCLUDED.winning_trades,
+            losing_trades = EXCLUDED.losing_trades,
+            daily_profits = EXCLUDED.daily_profits,
+            symbol_trade_counts = EXCLUDED.symbol_trade_counts,
+            updated_at = NOW()
+    """, rows, template="(%s::numeric, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb)")
+
+def save_deal_aggregates(aggregates):
+    """Upsert every aggregate that folded new deals since it was last saved"""
+    dirty = [agg for agg in aggregates if agg.dirty]
+    if not dirty:
+        return
     conn = None
     try:
         conn = get_db_connection()
         with conn.cursor() as cur:
-            cur.execute("SELECT breached FROM leaderboard WHERE account_id = %s::numeric", (str(account_id),))
-            result = cur.fetchone()
-            return result[0] if result else False
+            upsert_deal_aggregates(cur, dirty)
+            conn.commit()
+            for agg in dirty:
+                agg.dirty = False
+            logging.info(f"Saved deal aggregates for {len(dirty)} accounts")
     except Exception as e:
-        logging.error(f"Error fetching breach status: {str(e)}")
-        return False
+        logging.error(f"Error saving deal aggregates: {str(e)}")
+        traceback.print_exc()
     finally:
         if conn:
             return_db_connection(conn)
 
-def process_account(account):
-    try:
-        # Check if account is already breached
-        if fetch_breach_status(account["account_id"]):
-            logging.info(f"Skipping update for breached account {account['account_id']}")
-            return None
-            
-        if connect_to_mt5(account):
-            data = fetch_trading_data(account["account_id"], account["contestant_name"])
-            if data:
-                # Only update if the account wasn't previously breached
-                return data
-    finally:
-        mt5.shutdown()
+# Constants
+CYCLE_BUDGET = TICK_SECONDS  # a tick's polling and writes must finish before the next one
+# Start with a full re-download of every account's deal history instead of
+# resuming from the stored cursors (run with --rebuild-aggregates)
+REBUILD_AGGREGATES = False
+# Share the accounts with other poller nodes under this id (run with --node-id NAME)
+NODE_ID = os.getenv("POLLER_NODE_ID")
+main_running = False
 
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -320,16 +243,146 @@ class DecimalEncoder(json.JSONEncoder):
             return str(obj)
         return super(DecimalEncoder, self).default(obj)
 
-def safe_decimal(value, default=0):
-    """Safely convert a value to Decimal"""
-    if value is None:
-        return Decimal(str(default))
-    try:
-        return Decimal(str(float(value)))
-    except (ValueError, TypeError, decimal.InvalidOperation):
-        return Decimal(str(default))
-
-def update_leaderboard_db(account_data_list):
+# Rows sent per UPDATE statement by update_leaderboard_db
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))
+LEADERBOARD_ROW_TEMPLATE = (
+    "(%s::numeric, %s::numeric, %s::numeric, %s::numeric, %s::numeric, %s::numeric, "
+    "%s::text, %s::integer, %s::integer, %s::integer, %s::numeric, "
+    "%s::numeric, %s::numeric, %s::boolean, %s::timestamp, "
+    "%s::jsonb, %s::jsonb, %s::numeric, %s::numeric, %s::numeric)"
+)
+# Also bump last_update_time on rows whose values didn't change
+LEADERBOARD_HEARTBEAT = os.getenv("LEADERBOARD_HEARTBEAT", "0") == "1"
+# Rewrite an unchanged row anyway once its last write is this old (seconds)
+LEADERBOARD_REWRITE_AFTER = int(os.getenv("LEADERBOARD_REWRITE_AFTER", "3600"))
+
+# account_id -> (row values without last_update_time, monotonic time written)
+# for the rows this process has committed to the leaderboard
+_last_written = {}
+
+def _row_fingerprint(row):
+    # Everything except last_update_time (position 14) decides whether a write is needed
+    return row[:14] + row[15:]
+
+def leaderboard_row(data):
+    """The leaderboard values of one result, in LEADERBOARD_ROW_TEMPLATE order"""
+    symbol_trade_counts_json = json.dumps(
+        {k: str(v) for k, v in data.symbol_trade_counts.items()}
+    )
+    breaches_json = json.dumps(data.breaches, cls=DecimalEncoder)
+
+    # Plain floats and ints go straight to the adapter; the row
+    # template casts them to numeric on the server
+    return (
+        data.balance,
+        data.equity,
+        data.profit_loss,
+        data.return_pct,
+        data.lots_traded,
+        data.average_lots,
+        data.most_traded_symbol,
+        data.total_trades,
+        data.winning_trades,
+        data.losing_trades,
+        data.win_rate,
+        data.starting_day_balance,
+        data.daily_dd_limit,
+        data.breached,
+        # When the account was read, so a late replay can't overwrite a newer row
+        data.polled_at,
+        symbol_trade_counts_json,
+        breaches_json,
+        data.open_positions,
+        data.consistency_score,
+        str(data.account_id)
+    )
+
+def write_leaderboard_rows(cur, rows):
+    """Update the leaderboard with leaderboard_row() rows on cur, returns the updated account ids.
+
+    One UPDATE ... FROM (VALUES ...) statement per page instead of a round
+    trip per account. Already breached rows and rows holding a later poll
+    (written by another node, or before a spool replay) are never touched.
+    The caller commits.
+    """
+    updated = execute_values(cur, """
+        UPDATE leaderboard AS l SET 
+            balance = v.balance,
+            equity = v.equity,
+            profit_loss = v.profit_loss,
+            return = v.return_pct,
+            lots_traded = v.lots_traded,
+            average_lots = v.average_lots,
+            most_traded_symbol = v.most_traded_symbol,
+            total_trades = v.total_trades,
+            winning_trades = v.winning_trades,
+            losing_trades = v.losing_trades,
+            win_rate = v.win_rate,
+            starting_day_balance = v.starting_day_balance,
+            daily_dd_limit = v.daily_dd_limit,
+            breached = v.breached,
+            last_update_time = v.last_update_time,
+            symbol_trade_counts = v.symbol_trade_counts,
+            breaches = COALESCE(l.breaches, '[]'::jsonb) || v.breaches,
+            open_positions = v.open_positions,
+            consistency_score = v.consistency_score
+        FROM (VALUES %s) AS v (
+            balance, equity, profit_loss, return_pct, lots_traded, average_lots,
+            most_traded_symbol, total_trades, winning_trades, losing_trades, win_rate,
+            starting_day_balance, daily_dd_limit, breached, last_update_time,
+            symbol_trade_counts, breaches, open_positions, consistency_score, account_id
+        )
+        WHERE l.account_id = v.account_id
+          AND l.breached IS NOT TRUE
+          AND (l.last_update_time IS NULL OR l.last_update_time < v.last_update_time)
+        RETURNING l.account_id
+    """, rows, template=LEADERBOARD_ROW_TEMPLATE, page_size=DB_WRITE_BATCH_SIZE, fetch=True)
+    return [str(row[0]) for row in updated]
+
+def write_deal_metrics(cur, account_data_list):
+    """Update only the deal-derived columns of breached rows on cur, returns the updated account ids.
+
+    A breached account's balance, equity and breach flags stay as they were
+    at the breach, but its trade statistics follow the scoring rules, which
+    a backfill may have changed. The caller commits.
+    """
+    rows = [(
+        data.lots_traded,
+        data.average_lots,
+        data.most_traded_symbol,
+        data.total_trades,
+        data.winning_trades,
+        data.losing_trades,
+        data.win_rate,
+        json.dumps({k: str(v) for k, v in data.symbol_trade_counts.items()}),
+        data.consistency_score,
+        str(data.account_id)
+    ) for data in account_data_list]
+    updated = execute_values(cur, """
+        UPDATE leaderboard AS l SET
+            lots_traded = v.lots_traded,
+            average_lots = v.average_lots,
+            most_traded_symbol = v.most_traded_symbol,
+            total_trades = v.total_trades,
+            winning_trades = v.winning_trades,
+            losing_trades = v.losing_trades,
+            win_rate = v.win_rate,
+            symbol_trade_counts = v.symbol_trade_counts,
+            consistency_score = v.consistency_score
+        FROM (VALUES %s) AS v (
+            lots_traded, average_lots, most_traded_symbol, total_trades, winning_trades,
+            losing_trades, win_rate, symbol_trade_counts, consistency_score, account_id
+        )
+        WHERE l.account_id = v.account_id
+          AND l.breached IS TRUE
+        RETURNING l.account_id
+    """, rows, template=(
+        "(%s::numeric, %s::numeric, %s::text, %s::integer, %s::integer, "
+        "%s::integer, %s::numeric, %s::jsonb, %s::numeric, %s::numeric)"
+    ), page_size=DB_WRITE_BATCH_SIZE, fetch=True)
+    return [str(row[0]) for row in updated]
+
+def update_leaderboard_db(account_data_list, raise_errors=False):
     if not account_data_list:
         return
         
@@ -338,7 +391,7 @@ def update_leaderboard_db(account_data_list):
         conn = get_db_connection()
         with conn.cursor() as cur:
             # Cast account_ids to numeric array
-            account_ids = [safe_decimal(data["account_id"]) for data in account_data_list]
+            account_ids = [str(data.account_id) for data in account_data_list]
             cur.execute(
                 "SELECT account_id, breached FROM leaderboard WHERE account_id = ANY(%s::numeric[])",
                 (account_ids,)
@@ -347,108 +400,131 @@ def update_leaderboard_db(account_data_list):
 
             # Prepare batch update data
             batch_data = []
+            unchanged_ids = []
+            skipped_breached = 0
+            now = time.monotonic()
             for data in account_data_list:
-                account_id = str(data["account_id"])
+                account_id = str(data.account_id)
                 # Skip if account is already breached
                 if breached_accounts.get(account_id, False):
                     logging.info(f"Skipping DB update for breached account {account_id}")
+                    skipped_breached += 1
                     continue
 
-                symbol_trade_counts_json = json.dumps(
-                    {k: str(v) for k, v in data["symbol_trade_counts"].items()}, 
-                    cls=DecimalEncoder
-                )
-                breaches_json = json.dumps(data["breaches"], cls=DecimalEncoder)
-
-                batch_data.append((
-                    safe_decimal(data["balance"]),
-                    safe_decimal(data["equity"]),
-                    safe_decimal(data["profit_loss"]),
-                    safe_decimal(data["return"]),
-                    safe_decimal(data["lots_traded"]),
-                    safe_decimal(data["average_lots"]),
-                    data["most_traded_symbol"],
-                    int(data["total_trades"]),
-                    int(data["winning_trades"]),
-                    int(data["losing_trades"]),
-                    safe_decimal(data["win_rate"]),
-                    safe_decimal(data["starting_day_balance"]),
-                    safe_decimal(data["daily_dd_limit"]),
-                    data["breached"],
-                    datetime.now(),
-                    symbol_trade_counts_json,
-                    breaches_json,
-                    safe_decimal(data["open_positions"]),
-                    safe_decimal(data["consistency_score"]),
-                    str(data["account_id"])
-                ))
+                row = leaderboard_row(data)
 
+                # Nothing leaderboard-relevant changed since this process last wrote the row
+                previous = _last_written.get(account_id)
+                if previous and previous[0] == _row_fingerprint(row) and now - previous[1] < LEADERBOARD_REWRITE_AFTER:
+                    unchanged_ids.append(account_id)
+                    continue
+                batch_data.append(row)
+
+            written = 0
             if batch_data:
-                cur.executemany("""
-                    UPDATE leaderboard SET 
-                        balance = %s::numeric,
-                        equity = %s::numeric,
-                        profit_loss = %s::numeric,
-                        return = %s::numeric,
-                        lots_traded = %s::numeric,
-                        average_lots = %s::numeric,
-                        most_traded_symbol = %s,
-                        total_trades = %s,
-                        winning_trades = %s,
-                        losing_trades = %s,
-                        win_rate = %s::numeric,
-                        starting_day_balance = %s::numeric,
-                        daily_dd_limit = %s::numeric,
-                        breached = %s,
-                        last_update_time = %s,
-                        symbol_trade_counts = %s::jsonb,
-                        breaches = %s::jsonb,
-                        open_positions = %s::numeric,
-                        consistency_score = %s::numeric
-                    WHERE account_id = %s
-                """, batch_data)
+                started = time.monotonic()
+                updated = write_leaderboard_rows(cur, batch_data)
+                conn.commit()
+                written = len(updated)
+                updated = set(updated)
+                for row in batch_data:
+                    # A row that lost to a newer one must not count as written
+                    if row[-1] in updated:
+                        _last_written[row[-1]] = (_row_fingerprint(row), now)
+                elapsed = time.monotonic() - started
+                logging.info(f"Batch updated {written} of {len(batch_data)} accounts in {elapsed:.3f}s")
+
+            if unchanged_ids and LEADERBOARD_HEARTBEAT:
+                cur.execute(
+                    """
+                    UPDATE leaderboard SET last_update_time = %s
+                    WHERE account_id = ANY(%s::numeric[]) AND breached IS NOT TRUE
+                    """,
+                    (datetime.now(), unchanged_ids)
+                )
                 conn.commit()
-                logging.info(f"Batch updated {len(batch_data)} accounts")
+
+            logging.info(
+                f"Leaderboard write: {written} written, {len(unchanged_ids)} unchanged skipped, "
+                f"{skipped_breached} breached skipped, heartbeat {'on' if LEADERBOARD_HEARTBEAT else 'off'}"
+            )
     except Exception as e:
         logging.error(f"Error updating database: {str(e)}")
         traceback.print_exc()
+        if raise_errors:
+            raise
     finally:
         if conn:
             return_db_connection(conn)
 
-def update_metadata(all_account_data):
+def write_spooled(account_data_list, breach_sink=None):
+    """Leaderboard write for ResultSpool.drain, which needs to know when it failed.
+
+    Breach events go first and their failure fails the whole write: once the
+    row is flagged the account is never polled again, so the spooled result
+    is the only thing left to record its events from. Retried events insert
+    nothing twice.
+    """
+    if breach_sink is not None:
+        breached = [data for data in account_data_list if data.breached]
+        if breached:
+            breach_sink.record(breached)
+    update_leaderboard_db(account_data_list, raise_errors=True)
+
+def load_symbol_stats(aggregates=None):
+    """Restore the global symbol counts from the metadata row.
+
+    Before the first run that stored contributions they are seeded from the
+    per-account symbol counts of the deal aggregates instead.
+    """
     conn = None
     try:
         conn = get_db_connection()
         with conn.cursor() as cur:
-            # Calculate global trade counts
-            global_trade_counts = {}
-            for account_data in all_account_data:
-                if account_data and "symbol_trade_counts" in account_data:
-                    for symbol, count in account_data["symbol_trade_counts"].items():
-                        global_trade_counts[symbol] = global_trade_counts.get(symbol, 0) + int(count)
-
-            # Find the most traded symbol
-            most_traded_overall = None
-            if global_trade_counts:
-                most_traded_symbol = max(global_trade_counts.items(), key=lambda x: x[1])
-                most_traded_overall = {
-                    "most_traded_symbol": most_traded_symbol[0],
-                    "total_trades": most_traded_symbol[1],
-                    "global_trade_counts": global_trade_counts
-                }
-
-            # Update metadata table
-            metadata_json = json.dumps(most_traded_overall, cls=DecimalEncoder) if most_traded_overall else '{}'
-            cur.execute("""
-                INSERT INTO metadata (id, most_traded)
-                VALUES (1, %s::jsonb)
-                ON CONFLICT (id) DO UPDATE
-                SET most_traded = %s::jsonb,
-                    last_updated_time = NOW()
-            """, (metadata_json, metadata_json))
-            
+            cur.execute("SELECT symbol_contributions FROM metadata WHERE id = 1")
+            row = cur.fetchone()
+        conn.rollback()
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    if row and row[0] is not None:
+        return GlobalSymbolStats(row[0])
+    stats = GlobalSymbolStats({
+        account_id: agg.symbol_trade_count for account_id, agg in (aggregates or {}).items()
+    })
+    stats.dirty = bool(stats.contributions)
+    return stats
+
+def update_metadata(symbol_stats):
+    """Write the global most traded symbols, with the contributions when they changed"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            most_traded = symbol_stats.most_traded()
+            metadata_json = json.dumps(most_traded, cls=DecimalEncoder) if most_traded else '{}'
+            if symbol_stats.dirty:
+                contributions_json = json.dumps(symbol_stats.contributions)
+                cur.execute("""
+                    INSERT INTO metadata (id, most_traded, symbol_contributions)
+                    VALUES (1, %s::jsonb, %s::jsonb)
+                    ON CONFLICT (id) DO UPDATE
+                    SET most_traded = EXCLUDED.most_traded,
+                        symbol_contributions = EXCLUDED.symbol_contributions,
+                        last_updated_time = NOW()
+                """, (metadata_json, contributions_json))
+            else:
+                # Nothing changed; only mark the metadata as fresh
+                cur.execute("""
+                    INSERT INTO metadata (id, most_traded)
+                    VALUES (1, %s::jsonb)
+                    ON CONFLICT (id) DO UPDATE
+                    SET last_updated_time = NOW()
+                """, (metadata_json,))
+
             conn.commit()
+            symbol_stats.dirty = False
             logging.info("Metadata updated successfully")
     except Exception as e:
         logging.error(f"Error updating metadata: {str(e)}")
@@ -457,19 +533,313 @@ def update_metadata(all_account_data):
         if conn:
             return_db_connection(conn)
 
-def recreate_db_pool():
-    global db_pool
+def load_leaderboard_details():
+    """Every leaderboard row with the columns the read API shows for an account"""
+    conn = None
     try:
-        # Close existing pool if it exists
-        if db_pool:
-            db_pool.closeall()
-        
-        # Create new pool
-        db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, **DB_CONFIG)
-        logging.info("Database pool recreated successfully")
-    except Exception as e:
-        logging.error(f"Error recreating database pool: {str(e)}")
-        raise
+        conn = get_db_connection()
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"SELECT account_id, last_update_time, {', '.join(read_api.DETAIL_COLUMNS)} FROM leaderboard")
+            rows = cur.fetchall()
+        conn.rollback()
+    finally:
+        if conn:
+            return_db_connection(conn)
+    return rows
+
+def sync_peer_results(leases, rankings=None, symbol_stats=None):
+    """Fold the leaderboard rows other nodes wrote since the last sync into the global state.
+
+    Ranks, symbol counts and the read API cover the whole competition, but
+    each node only polls its own shards; the rest is read back from the
+    leaderboard table.
+    """
+    since = leases.peer_watermark
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Rows carry their writer's clock; overlap by a lease to allow for skew
+            cur.execute(f"""
+                SELECT account_id, last_update_time, {', '.join(read_api.DETAIL_COLUMNS)}
+                FROM leaderboard
+                WHERE last_update_time >= %s
+            """, (since - timedelta(seconds=leases.lease_ttl) if since else datetime.min,))
+            rows = cur.fetchall()
+        conn.rollback()
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    peer_rows = []
+    for row in rows:
+        account_id, updated = row["account_id"], row["last_update_time"]
+        if since is None or updated > since:
+            leases.peer_watermark = max(leases.peer_watermark or updated, updated)
+        if leases.owns(account_id):
+            continue
+        if rankings is not None:
+            rankings.set_standing(account_id, row["return"], row["balance"], row["contestant_name"], row["breached"])
+        if symbol_stats is not None and row["symbol_trade_counts"] is not None:
+            symbol_stats.apply(account_id, row["symbol_trade_counts"])
+        peer_rows.append(row)
+    read_api.publisher.seed(peer_rows)
+    return len(peer_rows)
+
+class PollerServices:
+    """The optional collaborators of run_cycle; whatever is left None is skipped.
+
+    scheduler picks the accounts due this tick, symbol_stats, rankings and
+    equity_store keep the competition-wide state, breach_sink stores breach
+    events, spool makes writes survive a database outage and leases limit
+    the node to its shards.
+    """
+    def __init__(self, scheduler=None, symbol_stats=None, equity_store=None, rankings=None,
+                 breach_sink=None, leases=None, spool=None):
+        self.scheduler = scheduler
+        self.symbol_stats = symbol_stats
+        self.equity_store = equity_store
+        self.rankings = rankings
+        self.breach_sink = breach_sink
+        self.leases = leases
+        self.spool = spool
+
+def run_cycle(mt5_workers, registry, aggregates, services=None):
+    """Poll every unbreached account once and write the results as they arrive.
+
+    Each collaborator set on services (a PollerServices) is used for its
+    part of the cycle. Returns the cycle's timings: duration, poller phases,
+    the phases reported by the workers for each account and event counts,
+    along with the account results.
+    """
+    services = services or PollerServices()
+    scheduler, symbol_stats, equity_store = services.scheduler, services.symbol_stats, services.equity_store
+    rankings, breach_sink, leases, spool = services.rankings, services.breach_sink, services.leases, services.spool
+    timer = instrumentation.begin()
+    account_phases = {}
+
+    def write(batch):
+        write_spooled(batch, breach_sink)
+
+    def drain_spool():
+        if leases is None:
+            spool.drain(write)
+        elif leases.valid:
+            # Expired leases say nothing about ownership; the results wait until they're renewed
+            spool.drain(write, owns=leases.owns)
+
+    # One query picks up new contestants, breach flags and starting balances
+    with phase("registry"):
+        # A warm-started registry is polled as is until the database is up
+        if not registry.warm or database_ready.is_set():
+            try:
+                registry.refresh()
+            except Exception as e:
+                # Poll the accounts already known, as after a warm start, until the database is back
+                logging.error(f"Error refreshing account registry, polling the {len(registry.accounts)} known accounts: {str(e)}")
+    leader = True
+    if leases is not None:
+        with phase("leases"):
+            try:
+                gained, _ = leases.rebalance()
+            except Exception as e:
+                # The shards held stay owned until their leases would have run out
+                logging.error(f"Error rebalancing shard leases, keeping {len(leases.owned)} shards until they expire: {str(e)}")
+                gained = None
+            leader = leases.leader
+            if gained is not None:
+                try:
+                    taken_over = [account_id for account_id in registry.accounts if shard_of(account_id, leases.shard_count) in gained]
+                    if taken_over:
+                        # Another node polled these last; pick up its deal cursors and equity samples.
+                        # A rebuild keeps folding every account it polls from the full history instead
+                        if not REBUILD_AGGREGATES:
+                            taken_over_aggregates = load_deal_aggregates(taken_over)
+                            for account_id in taken_over:
+                                aggregates.pop(account_id, None)
+                            aggregates.update(taken_over_aggregates)
+                        if equity_store is not None:
+                            equity_store.load(taken_over)
+                    sync_peer_results(leases, rankings, symbol_stats)
+                except Exception as e:
+                    logging.error(f"Error loading the state of other nodes' accounts: {str(e)}")
+    if spool is not None and spool.depth:
+        # Results spooled during an outage go out even if nothing is due this tick
+        with phase("spool_drain"):
+            drain_spool()
+    # One line per tick rather than one per breached account
+    skipped = [account for account in registry.breached_accounts() if leases is None or leases.owns(account.account_id)]
+    if skipped:
+        logging.info(f"Skipping {len(skipped)} breached accounts")
+
+    active = registry.active_accounts()
+    if leases is not None:
+        active = [account for account in active if leases.owns(account.account_id)]
+    # Accounts whose credentials keep being rejected sit out their backoff
+    active = [account for account in active if not mt5_workers.login_backoff.blocked(account)]
+    if scheduler is not None:
+        scheduler.sync([account.account_id for account in active])
+        by_id = {account.account_id: account for account in active}
+        active = [by_id[account_id] for account_id in scheduler.select()]
+
+    tasks = []
+    for account in active:
+        account_id = account.account_id
+        aggregate = aggregates.setdefault(account_id, DealAggregate(account_id))
+        last_sample = equity_store.last_sample(account_id) if equity_store is not None else None
+        tasks.append((account, {account_id: account.starting_day_balance}, aggregate, last_sample))
+
+    all_account_data = []
+    answered = set()
+
+    def handle(result):
+        account_id, data, aggregate, timings = result
+        answered.add(account_id)
+        # The worker folded new deals into its own copy of the aggregate
+        aggregates[account_id] = aggregate
+        account_phases[account_id] = timings["phases"]
+        for name, amount in timings["counts"].items():
+            instrumentation.count(name, amount)
+        if scheduler is not None:
+            scheduler.update(account_id, data, cost=sum(timings["phases"].values()))
+        if data:
+            all_account_data.append(data)
+            if data.day_open_captured:
+                logging.info(f"New trading day for account {data.account_id}, starting day balance {data.starting_day_balance}")
+            if equity_store is not None:
+                equity_store.record(data)
+        return data
+
+    def flush(batch):
+        # With a spool the breach events are stored by its drain, retried until they are
+        if breach_sink is not None and spool is None:
+            breached = [data for data in batch if data.breached]
+            if breached:
+                with phase("breach_events"):
+                    try:
+                        breach_sink.record(breached)
+                    except Exception as e:
+                        # The leaderboard write below still flags the account
+                        logging.error(f"Error recording breach events: {str(e)}")
+        # The leaderboard row carries any new starting day balance
+        with phase("db_write"):
+            if spool is not None:
+                spool.append(batch)
+                drain_spool()
+            else:
+                update_leaderboard_db(batch)
+        registry.record_results(batch)
+        if equity_store is not None:
+            with phase("equity_write"):
+                try:
+                    equity_store.write()
+                except Exception as e:
+                    # The samples stay queued and go out with the next batch
+                    logging.error(f"Error writing equity snapshots: {str(e)}")
+
+    # Results are written in batches while the workers are still polling the rest
+    with phase("pipeline"):
+        run_pipeline(mt5_workers.iter_results(tasks), handle, flush, urgent=lambda data: data.breached)
+
+    if scheduler is not None:
+        for account in active:
+            if account.account_id not in answered:
+                # Timed out or lost with its worker; charge the full timeout
+                scheduler.update(account.account_id, None, cost=mt5_workers.account_timeout)
+
+    if symbol_stats is not None:
+        with phase("metadata"):
+            for data in all_account_data:
+                symbol_stats.apply(data.account_id, data.symbol_trade_counts)
+            symbol_stats.retain(registry.accounts)
+            if leader and (all_account_data or symbol_stats.dirty):
+                update_metadata(symbol_stats)
+    if rankings is not None:
+        with phase("rankings"):
+            rankings.update(all_account_data)
+            rankings.retain(registry.accounts)
+            try:
+                rows = rankings.compute()
+                if leader:
+                    rankings.write(rows)
+            except Exception as e:
+                logging.error(f"Error writing leaderboard ranks: {str(e)}")
+                traceback.print_exc()
+    with phase("aggregates_save"):
+        save_deal_aggregates(aggregates.values())
+    if equity_store is not None and leader:
+        with phase("equity_compaction"):
+            try:
+                equity_store.compact()
+            except Exception as e:
+                logging.error(f"Error compacting equity snapshots: {str(e)}")
+
+    return {
+        "duration": timer.elapsed(),
+        "accounts_polled": len(tasks),
+        "accounts_updated": len(all_account_data),
+        "phases": timer.phases,
+        "account_phases": account_phases,
+        "counts": timer.counts,
+        "results": all_account_data,
+    }
+
+def record_cycle_metrics(report):
+    """Feed a run_cycle report into the metrics and flag cycles that blew the budget"""
+    if instrumentation.metrics.record_cycle(report, CYCLE_BUDGET):
+        slowest = sorted(
+            report["account_phases"].items(), key=lambda item: sum(item[1].values()), reverse=True
+        )[:5]
+        logging.warning(
+            f"Cycle overran its {CYCLE_BUDGET}s budget: {report['duration']:.1f}s, "
+            f"phases {', '.join(f'{name}={seconds:.1f}s' for name, seconds in report['phases'].items())}; "
+            f"slowest accounts {', '.join(f'{account_id}={sum(phases.values()):.1f}s' for account_id, phases in slowest)}"
+        )
+    else:
+        logging.info(f"Cycle finished in {report['duration']:.1f}s")
+
+    pool_stats = db_pool.metrics()
+    logging.info(
+        f"DB pool: {pool_stats['in_use']} in use, {pool_stats['idle']} idle, "
+        f"checkout wait avg {pool_stats['checkout_wait_avg']:.3f}s max {pool_stats['checkout_wait_max']:.3f}s, "
+        f"{pool_stats['reconnects']} reconnects, {pool_stats['connect_failures']} failed connects"
+    )
+    for name, value in pool_stats.items():
+        instrumentation.metrics.set_gauge(f"db_pool_{name}", value)
+    if instrumentation.METRICS_JSON_PATH:
+        try:
+            instrumentation.metrics.dump_json(instrumentation.METRICS_JSON_PATH)
+        except OSError as e:
+            logging.error(f"Error writing metrics to {instrumentation.METRICS_JSON_PATH}: {str(e)}")
+
+def open_database(equity_store, warm_aggregates=None):
+    """Connect, create the schema and load the service state, retrying until the database answers.
+
+    Returns (aggregates, symbol_stats, rankings). With warm_aggregates from
+    a snapshot the aggregates and equity samples aren't reloaded and None is
+    returned for them.
+    """
+    while True:
+        try:
+            db_pool.warm()
+            ensure_schema()
+            aggregates = None
+            if warm_aggregates is None:
+                aggregates = {} if REBUILD_AGGREGATES else load_deal_aggregates()
+                if REBUILD_AGGREGATES:
+                    logging.info("Rebuilding deal aggregates from the full history")
+                equity_store.load()
+            symbol_stats = load_symbol_stats(aggregates if aggregates is not None else warm_aggregates)
+            rankings = RankingBoard(db_pool)
+            rankings.load()
+            # Accounts this process won't poll (breached, other nodes') still get their details
+            read_api.publisher.seed(load_leaderboard_details())
+            database_ready.set()
+            logging.info("Database ready")
+            return aggregates, symbol_stats, rankings
+        except Exception as e:
+            logging.error(f"Database startup failed, retrying in 5 seconds: {str(e)}")
+            time.sleep(5)
 
 def main():
     global main_running
@@ -481,72 +851,88 @@ def main():
         main_running = True
         logging.info("Starting main function.")
         
-        with DatabasePool() as pool:
-            global db_pool
-            db_pool = pool
-            
-            while True:
-                try:
-                    # Reconnect to database pool before each cycle
-                    logging.info("Reconnecting to database pool...")
-                    recreate_db_pool()
-                    logging.info("Database pool reconnection successful")
-
-                    # Fetch all breach statuses at once
-                    breach_statuses = fetch_all_breach_statuses()
-                    
-                    # Fetch all starting day balances at once
-                    conn = get_db_connection()
-                    with conn.cursor() as cur:
-                        cur.execute("SELECT account_id, starting_day_balance FROM leaderboard")
-                        starting_day_balances = {str(row[0]): row[1] for row in cur.fetchall()}
-                    return_db_connection(conn)
-                    
-                    all_account_data = []
-                    for account in ACCOUNTS:
-                        account_id = str(account["account_id"])
-                        
-                        # Skip already breached accounts
-                        if breach_statuses.get(account_id, False):
-                            logging.info(f"Skipping breached account {account_id}")
-                            continue
-                            
-                        if connect_to_mt5(account):
-                            data = fetch_trading_data(
-                                account["account_id"], 
-                                account["contestant_name"],
-                                starting_day_balances
+        instrumentation.serve_metrics()
+        read_api.serve_read_api()
+        # A sharded node can't know its accounts before it holds leases
+        warm = None if REBUILD_AGGREGATES or NODE_ID else load_snapshot()
+        registry = AccountRegistry(db_pool)
+        equity_store = EquityStore(db_pool)
+        aggregates = symbol_stats = rankings = None
+        if warm is not None:
+            registry.seed(warm.accounts)
+            aggregates = warm.aggregates
+            equity_store.last_samples = warm.last_samples
+        # The database connects while the MT5 workers start (and, warm, while the first cycles poll)
+        startup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database-startup")
+        startup = startup_executor.submit(open_database, equity_store, dict(aggregates) if warm else None)
+        startup_executor.shutdown(wait=False)
+
+        with MT5WorkerPool() as mt5_workers:
+            if warm is None:
+                aggregates, symbol_stats, rankings = startup.result()
+            services = PollerServices(
+                scheduler=PollScheduler(mt5_workers.size),
+                symbol_stats=symbol_stats,
+                equity_store=equity_store,
+                rankings=rankings,
+                breach_sink=BreachEventSink(db_pool),
+            )
+            if NODE_ID:
+                services.leases = ShardLeases(db_pool, NODE_ID)
+                services.leases.start_heartbeat()
+                logging.info(f"Sharing accounts with other poller nodes as {NODE_ID}")
+            services.spool = ResultSpool().open() if RESULT_SPOOL_PATH else None
+            # account_id -> latest result polled before symbol stats and ranks were loaded
+            early_results = {}
+
+            try:
+                while True:
+                    try:
+                        if services.symbol_stats is None and startup.done():
+                            _, symbol_stats, rankings = startup.result()
+                            for data in early_results.values():
+                                symbol_stats.apply(data.account_id, data.symbol_trade_counts)
+                            rankings.update(early_results.values())
+                            early_results = {}
+                            services.symbol_stats, services.rankings = symbol_stats, rankings
+                        report = run_cycle(mt5_workers, registry, aggregates, services)
+                        record_cycle_metrics(report)
+                        if services.symbol_stats is None:
+                            early_results.update((data.account_id, data) for data in report["results"])
+                        else:
+                            read_api.publisher.publish(
+                                services.rankings.rows, report["results"], services.symbol_stats.most_traded()
                             )
-                            if data:
-                                all_account_data.append(data)
-                            mt5.shutdown()
-                            time.sleep(0.5)
-
-                    # Batch update all accounts at once
-                    if all_account_data:
-                        update_leaderboard_db(all_account_data)
-                        update_metadata(all_account_data)
-
-                    current_time = datetime.now()
-                    next_5_minute_mark = current_time.replace(second=0, microsecond=0) + timedelta(minutes=(5 - (current_time.minute % 5)))
-                    time_to_wait = (next_5_minute_mark - current_time).total_seconds()
-                    if time_to_wait < 0:
-                        next_5_minute_mark += timedelta(minutes=5)
-                        time_to_wait = (next_5_minute_mark - current_time).total_seconds()
-                    logging.info(f"Waiting for the next 5-minute mark. Waiting {time_to_wait} seconds.")
-                    time.sleep(time_to_wait)
+                        try:
+                            save_snapshot(registry, aggregates, equity_store)
+                        except OSError as e:
+                            logging.error(f"Error saving warm-start snapshot: {str(e)}")
+
+                        time_to_wait = services.scheduler.next_wakeup()
+                        logging.info(f"Waiting for the next scheduler tick. Waiting {time_to_wait:.1f} seconds.")
+                        time.sleep(time_to_wait)
                     
-                except Exception as e:
-                    logging.error(f"Error in main loop: {str(e)}")
-                    traceback.print_exc()
-                    time.sleep(5)  # Wait before retrying
+                    except Exception as e:
+                        logging.error(f"Error in main loop: {str(e)}")
+                        traceback.print_exc()
+                        time.sleep(5)  # Wait before retrying
                     
+            finally:
+                if services.spool is not None:
+                    services.spool.close()
+                if services.leases is not None:
+                    # Hand the shards over now instead of after the lease runs out
+                    services.leases.release()
     except Exception as e:
         logging.error(f"Main function error: {str(e)}")
     finally:
         main_running = False
 
 if __name__ == "__main__":
+    if "--rebuild-aggregates" in sys.argv[1:]:
+        REBUILD_AGGREGATES = True
+    if "--node-id" in sys.argv[1:-1]:
+        NODE_ID = sys.argv[sys.argv.index("--node-id") + 1]
     try:
         main()
     except Exception as e:
@@ -0,0 +1,224 @@
+"""Recompute every account's leaderboard metrics from its full deal history.
+
+After a scoring rule changes (the consistency score, how trades are
+counted, ...) the live loop only picks it up account by account. This
+rebuilds them all at once:
+
+    python backfill.py [--workers 8] [--accounts 1001,1002] [--dry-run] [--replay recorded.json]
+
+Each account's complete deal history is pulled again through the MT5
+worker pool (one terminal per process, --workers of them) and folded into a
+fresh deal aggregate, so every metric comes out of the current code.
+Breached accounts are recomputed too, but only their deal-derived columns
+(DEAL_FIELDS) are written: balance, equity and the breach itself stay as
+they were when the account breached. The recomputed leaderboard rows and
+deal aggregates are written in a single transaction at the end: either
+every account is updated or none is. New breaches of active accounts found
+along the way are stored as breach events afterwards.
+
+--dry-run writes nothing and prints, per account, the values that would
+change against the current leaderboard. --replay serves histories recorded
+with `python -m benchmarks.cycle record` through fake_mt5 instead of the
+live terminals.
+
+The poller must be stopped while this runs, otherwise its next cycle saves
+its own aggregates over the rebuilt ones. Before writing, the warm-start
+snapshot (WARM_START_PATH, so run this from the poller's directory) is
+deleted, so the restarted poller loads the rebuilt aggregates from the
+database instead of its stale copy.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Leaderboard columns compared by --dry-run, with the result field each comes from
+DIFF_FIELDS = (
+    ("balance", "balance"),
+    ("equity", "equity"),
+    ("profit_loss", "profit_loss"),
+    ("return", "return_pct"),
+    ("lots_traded", "lots_traded"),
+    ("average_lots", "average_lots"),
+    ("most_traded_symbol", "most_traded_symbol"),
+    ("total_trades", "total_trades"),
+    ("winning_trades", "winning_trades"),
+    ("losing_trades", "losing_trades"),
+    ("win_rate", "win_rate"),
+    ("open_positions", "open_positions"),
+    ("consistency_score", "consistency_score"),
+    ("breached", "breached"),
+)
+# The DIFF_FIELDS that come from the deal history alone, all a breached account gets rewritten
+DEAL_FIELDS = (
+    "lots_traded", "average_lots", "most_traded_symbol", "total_trades", "winning_trades",
+    "losing_trades", "win_rate", "consistency_score",
+)
+# Numbers closer than this count as unchanged (the leaderboard keeps two decimals)
+TOLERANCE = 0.005
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5
+
+
+def _changed(old, new):
+    if old is None or new is None:
+        return old is not new
+    if isinstance(new, bool) or isinstance(new, str):
+        return old != new
+    try:
+        return abs(float(old) - float(new)) > TOLERANCE
+    except (TypeError, ValueError):
+        return old != new
+
+
+def diff(current, results):
+    """{account_id: [(column, old, new)]} for the results that differ from the leaderboard.
+
+    Rows already breached are compared on DEAL_FIELDS only, the columns a
+    backfill rewrites for them.
+    """
+    changes = {}
+    for data in results:
+        row = current.get(str(data.account_id))
+        if row is None:
+            continue
+        fields = [
+            (column, row[column], getattr(data, field))
+            for column, field in DIFF_FIELDS
+            if (column in DEAL_FIELDS or not row["breached"]) and _changed(row[column], getattr(data, field))
+        ]
+        if fields:
+            changes[str(data.account_id)] = fields
+    return changes
+
+
+def _progress(done, total, deals, started, failed):
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed > 0 else 0
+    eta = (total - done) / rate if rate > 0 else 0
+    print(
+        f"[{done}/{total}] {rate:.1f} accounts/s, {deals / elapsed if elapsed > 0 else 0:.0f} deals/s, "
+        f"{failed} failed, {elapsed:.0f}s elapsed, ~{eta:.0f}s left",
+        file=sys.stderr
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, help="MT5 worker processes (default MT5_WORKERS)")
+    parser.add_argument("--accounts", help="comma separated account ids instead of every active account")
+    parser.add_argument("--dry-run", action="store_true", help="print what would change instead of writing")
+    parser.add_argument("--replay", help="recorded histories to serve through fake_mt5")
+    parser.add_argument("--account-timeout", type=float, default=300, help="seconds per account history")
+    args = parser.parse_args()
+
+    if args.replay:
+        os.environ["MT5_BACKEND"] = "fake_mt5"
+        os.environ["FAKE_MT5_REPLAY"] = os.path.abspath(args.replay)
+    # Imported only now so the MT5 backend above is the one the service loads
+    import app
+    from account_registry import AccountRegistry
+    from breach_events import BreachEventSink
+    from deal_aggregates import DealAggregate
+    from mt5_pool import MT5WorkerPool
+    from warm_start import WARM_START_PATH, discard_snapshot
+
+    app.ensure_schema()
+    registry = AccountRegistry(app.db_pool)
+    registry.refresh()
+    accounts = list(registry.accounts.values())
+    if args.accounts:
+        wanted = {account_id.strip() for account_id in args.accounts.split(",")}
+        accounts = [account for account in accounts if account.account_id in wanted]
+    tasks = [
+        # A fresh aggregate makes the worker fold the whole history; no last
+        # sample leaves the starting day balance alone
+        (account, {account.account_id: account.starting_day_balance}, DealAggregate(account.account_id), None)
+        for account in accounts
+    ]
+    total = len(tasks)
+    breached_ids = {account.account_id for account in accounts if account.breached}
+    print(
+        f"Recomputing {total} accounts, {len(breached_ids)} of them breached (deal metrics only)"
+        f"{' (dry run)' if args.dry_run else ''}",
+        file=sys.stderr
+    )
+
+    results, aggregates = [], []
+    answered = set()
+    deals = 0
+    started = last_progress = time.monotonic()
+    with MT5WorkerPool(workers=args.workers, account_timeout=args.account_timeout) as workers:
+        for account_id, data, aggregate, _ in workers.iter_results(tasks):
+            answered.add(account_id)
+            if data:
+                results.append(data)
+                aggregates.append(aggregate)
+                deals += aggregate.deal_count
+            if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                _progress(len(answered), total, deals, started, len(answered) - len(results))
+    failed = sorted({account.account_id for account in accounts} - {str(data.account_id) for data in results})
+    _progress(len(answered), total, deals, started, len(failed))
+    if failed:
+        print(f"Could not recompute {len(failed)} accounts: {', '.join(failed)}", file=sys.stderr)
+
+    if args.dry_run:
+        conn = app.get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT account_id, {', '.join(column for column, _ in DIFF_FIELDS)} FROM leaderboard "
+                    f"WHERE account_id = ANY(%s::numeric[])",
+                    ([str(data.account_id) for data in results],)
+                )
+                names = [column.name for column in cur.description]
+                current = {str(row[0]): dict(zip(names, row)) for row in cur.fetchall()}
+            conn.rollback()
+        finally:
+            app.return_db_connection(conn)
+        changes = diff(current, results)
+        per_column = {}
+        for account_id, fields in sorted(changes.items()):
+            print(f"{account_id}{' (breached)' if account_id in breached_ids else ''}: " + ", ".join(f"{column} {old} -> {new}" for column, old, new in fields))
+            for column, _, _ in fields:
+                per_column[column] = per_column.get(column, 0) + 1
+        print(
+            f"{len(changes)} of {len(results)} accounts would change "
+            f"({len([account_id for account_id in changes if account_id in breached_ids])} breached)"
+            + (": " + ", ".join(f"{column} {n}" for column, n in sorted(per_column.items(), key=lambda item: -item[1])) if per_column else ""),
+            file=sys.stderr
+        )
+        return
+
+    if discard_snapshot():
+        print(f"Deleted the warm-start snapshot {WARM_START_PATH}", file=sys.stderr)
+    active = [data for data in results if str(data.account_id) not in breached_ids]
+    breached = [data for data in results if str(data.account_id) in breached_ids]
+    write_started = time.monotonic()
+    conn = app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            updated = app.write_leaderboard_rows(cur, [app.leaderboard_row(data) for data in active])
+            updated += app.write_deal_metrics(cur, breached)
+            app.upsert_deal_aggregates(cur, aggregates)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        app.return_db_connection(conn)
+    print(
+        f"Wrote {len(updated)} leaderboard rows ({len(breached)} breached, deal metrics only) "
+        f"and {len(aggregates)} deal aggregates in one transaction "
+        f"in {time.monotonic() - write_started:.2f}s",
+        file=sys.stderr
+    )
+    new_breaches = [data for data in active if data.breached]
+    if new_breaches:
+        events = BreachEventSink(app.db_pool).record(new_breaches)
+        print(f"Recorded {len(events)} new breach events", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""End-to-end benchmark of the polling cycle against a fake MT5 backend.
+
+Drives app.run_cycle with the real worker pool, registry and database writes,
+but with MetaTrader5 replaced by fake_mt5, and reports per-phase timings as
+JSON so runs can be compared over time. Point it at a scratch Postgres:
+
+    python -m benchmarks.cycle run --dsn postgresql://postgres@127.0.0.1/bench \\
+        --reset-db --accounts 200 --deals 2000 --workers 8 --cycles 3 \\
+        --login-latency 1.5 --latency 0.05 --output bench.json
+
+With --node-id the run takes part in shard leasing, so several copies
+started against the same database split the accounts between them (only
+the first should pass --reset-db):
+
+    python -m benchmarks.cycle run --dsn ... --node-id a --cycles 20 --interval 2 &
+    python -m benchmarks.cycle run --dsn ... --node-id b --cycles 20 --interval 2 &
+
+Accounts and deals are generated by fake_mt5 unless --replay names a file of
+recorded histories. Recording one needs the live terminal and database:
+
+    python -m benchmarks.cycle record recorded.json
+
+--reset-db DROPS and recreates the leaderboard, metadata and service tables; never use
+it against the production database.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ACCOUNT_ID_BASE = 1000
+
+SCRATCH_SCHEMA = """
+    DROP TABLE IF EXISTS leaderboard, metadata, deal_aggregates, equity_snapshots, leaderboard_ranks, breach_events,
+        shard_leases, poller_nodes;
+    CREATE TABLE leaderboard (
+        account_id numeric PRIMARY KEY,
+        server text,
+        password text,
+        contestant_name text,
+        balance numeric,
+        equity numeric,
+        profit_loss numeric,
+        return numeric,
+        lots_traded numeric,
+        average_lots numeric,
+        most_traded_symbol text,
+        total_trades integer,
+        winning_trades integer,
+        losing_trades integer,
+        win_rate numeric,
+        starting_day_balance numeric,
+        daily_dd_limit numeric,
+        breached boolean DEFAULT false,
+        last_update_time timestamp,
+        symbol_trade_counts jsonb,
+        breaches jsonb,
+        open_positions numeric,
+        consistency_score numeric
+    );
+    CREATE TABLE metadata (
+        id integer PRIMARY KEY,
+        most_traded jsonb,
+        last_updated_time timestamp DEFAULT NOW()
+    );
+"""
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """count/total/mean/p50/p95/max for every phase in a {phase: [seconds]} dict"""
+    summary = {}
+    for name, values in sorted(samples.items()):
+        values = sorted(values)
+        summary[name] = {
+            "count": len(values),
+            "total": round(sum(values), 6),
+            "mean": round(sum(values) / len(values), 6),
+            "p50": round(percentile(values, 0.5), 6),
+            "p95": round(percentile(values, 0.95), 6),
+            "max": round(values[-1], 6),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_database(dsn, account_ids):
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCRATCH_SCHEMA)
+            cur.executemany(
+                """
+                INSERT INTO leaderboard (account_id, server, password, contestant_name, starting_day_balance)
+                VALUES (%s, 'Bench-Server', 'bench', %s, 100000)
+                """,
+                [(account_id, f"contestant {account_id}") for account_id in account_ids]
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(args):
+    os.environ["MT5_BACKEND"] = "fake_mt5"
+    os.environ["LEADERBOARD_DB_DSN"] = args.dsn
+    os.environ["FAKE_MT5_SEED"] = str(args.seed)
+    os.environ["FAKE_MT5_DEALS"] = str(args.deals)
+    os.environ["FAKE_MT5_LATENCY"] = str(args.latency)
+    os.environ["FAKE_MT5_STARTUP_LATENCY"] = str(args.startup_latency)
+    os.environ["FAKE_MT5_LOGIN_LATENCY"] = str(args.login_latency)
+    os.environ["FAKE_MT5_DEAL_LATENCY"] = str(args.deal_latency)
+    os.environ["FAKE_MT5_JITTER"] = str(args.jitter)
+    if args.replay:
+        os.environ["FAKE_MT5_REPLAY"] = os.path.abspath(args.replay)
+        with open(args.replay) as f:
+            account_ids = [int(login) for login in json.load(f)["accounts"]]
+    else:
+        account_ids = list(range(ACCOUNT_ID_BASE, ACCOUNT_ID_BASE + args.accounts))
+
+    if args.reset_db:
+        reset_database(args.dsn, account_ids)
+
+    # Imported only now so the service picks up the environment set above
+    import app
+    import mt5_pool
+    from account_registry import AccountRegistry
+    from equity_store import EquityStore
+    from rankings import RankingBoard
+    from breach_events import BreachEventSink
+    from shard_leases import ShardLeases
+    from result_spool import ResultSpool
+
+    if not args.verbose:
+        for handler in logging.getLogger().handlers:
+            handler.setLevel(logging.WARNING)
+    mt5_pool.ACCOUNT_PAUSE = args.account_pause
+
+    app.ensure_schema()
+    registry = AccountRegistry(app.db_pool)
+    aggregates = app.load_deal_aggregates()
+    symbol_stats = app.load_symbol_stats(aggregates)
+    equity_store = EquityStore(app.db_pool)
+    equity_store.load()
+    rankings = RankingBoard(app.db_pool)
+    rankings.load()
+    breach_sink = BreachEventSink(app.db_pool)
+    leases = None
+    if args.node_id:
+        leases = ShardLeases(app.db_pool, args.node_id, shard_count=args.shards, lease_ttl=args.lease_ttl)
+        leases.start_heartbeat()
+    spool = ResultSpool(args.spool).open() if args.spool else None
+    services = app.PollerServices(
+        symbol_stats=symbol_stats, equity_store=equity_store, rankings=rankings,
+        breach_sink=breach_sink, leases=leases, spool=spool
+    )
+    cycles = []
+    account_samples = {}
+    cycle_samples = {}
+    counts = {}
+    started = time.perf_counter()
+    with mt5_pool.MT5WorkerPool(workers=args.workers, account_timeout=args.account_timeout) as workers:
+        for n in range(args.cycles):
+            if n and args.interval:
+                time.sleep(args.interval)
+            report = app.run_cycle(workers, registry, aggregates, services)
+            for phases in report["account_phases"].values():
+                for name, seconds in phases.items():
+                    account_samples.setdefault(name, []).append(seconds)
+            for name, seconds in report["phases"].items():
+                cycle_samples.setdefault(name, []).append(seconds)
+            cycle_samples.setdefault("cycle", []).append(report["duration"])
+            for name, amount in report["counts"].items():
+                counts[name] = counts.get(name, 0) + amount
+            cycles.append({
+                "cycle": n + 1,
+                "duration": round(report["duration"], 6),
+                "accounts_polled": report["accounts_polled"],
+                "accounts_updated": report["accounts_updated"],
+                "shards": len(leases.owned) if leases else None,
+                "phases": {name: round(seconds, 6) for name, seconds in report["phases"].items()},
+            })
+            shards = f", {len(leases.owned)} shards{' (leader)' if leases.leader else ''}" if leases else ""
+            print(f"cycle {n + 1}: {report['duration']:.3f}s, {report['accounts_updated']}/{report['accounts_polled']} accounts{shards}", file=sys.stderr)
+        worker_restarts = workers.restarts
+    if leases is not None:
+        leases.release()
+    if spool is not None:
+        spool.close()
+
+    result = {
+        "benchmark": "cycle",
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "mode": "replay" if args.replay else "synthetic",
+            "accounts": len(account_ids),
+            "deals_per_account": None if args.replay else args.deals,
+            "workers": args.workers,
+            "cycles": args.cycles,
+            "latency": args.latency,
+            "startup_latency": args.startup_latency,
+            "login_latency": args.login_latency,
+            "deal_latency": args.deal_latency,
+            "jitter": args.jitter,
+            "seed": args.seed,
+            "node_id": args.node_id,
+            "spool": bool(args.spool),
+        },
+        "total_seconds": round(time.perf_counter() - started, 6),
+        "worker_restarts": worker_restarts,
+        "cycles": cycles,
+        "cycle_phases": summarize(cycle_samples),
+        "account_phases": summarize(account_samples),
+        "counts": counts,
+        "db_pool": app.db_pool.metrics(),
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def record(args):
+    """Dump account info, positions and full deal history of every active account"""
+    import app
+    from account_registry import AccountRegistry
+    from mt5_client import mt5, connect_to_mt5, START_DATE
+
+    registry = AccountRegistry(app.db_pool)
+    registry.refresh()
+    accounts = {}
+    for account in registry.active_accounts():
+        try:
+            if not connect_to_mt5(account):
+                continue
+            info = mt5.account_info()
+            deals = mt5.history_deals_get(START_DATE, datetime.now()) or ()
+            positions = mt5.positions_get() or ()
+            if info is None:
+                continue
+            accounts[account.account_id] = {
+                "balance": info.balance,
+                "equity": info.equity,
+                "positions": [position._asdict() for position in positions],
+                "deals": [deal._asdict() for deal in deals],
+            }
+        finally:
+            mt5.shutdown()
+            time.sleep(0.5)
+
+    with open(args.path, "w") as f:
+        json.dump({"recorded": datetime.now().isoformat(), "accounts": accounts}, f)
+    print(f"Recorded {len(accounts)} accounts to {args.path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark polling cycles against fake_mt5")
+    run_parser.add_argument("--dsn", default=os.getenv("BENCH_DB_DSN", "postgresql://postgres@127.0.0.1:5432/postgres"))
+    run_parser.add_argument("--reset-db", action="store_true", help="drop and recreate the scratch tables first")
+    run_parser.add_argument("--accounts", type=int, default=50)
+    run_parser.add_argument("--deals", type=int, default=500, help="deals generated per account")
+    run_parser.add_argument("--replay", help="recorded histories to serve instead of generated ones")
+    run_parser.add_argument("--workers", type=int, default=4)
+    run_parser.add_argument("--cycles", type=int, default=3)
+    run_parser.add_argument("--latency", type=float, default=0.02, help="seconds per MT5 call")
+    run_parser.add_argument("--startup-latency", type=float, default=0.0, help="extra seconds per terminal start")
+    run_parser.add_argument("--login-latency", type=float, default=0.5, help="extra seconds per login")
+    run_parser.add_argument("--deal-latency", type=float, default=0.00001, help="extra seconds per deal returned")
+    run_parser.add_argument("--jitter", type=float, default=0.2)
+    run_parser.add_argument("--account-pause", type=float, default=0.5)
+    run_parser.add_argument("--account-timeout", type=float, default=60)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--interval", type=float, default=0.0, help="seconds to sleep between cycles")
+    run_parser.add_argument("--node-id", help="share the accounts with other runs through shard leases")
+    run_parser.add_argument("--shards", type=int, default=64)
+    run_parser.add_argument("--lease-ttl", type=float, default=10, help="seconds a node's leases outlive its last heartbeat")
+    run_parser.add_argument("--spool", help="spool results through this file before writing them")
+    run_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    run_parser.add_argument("--verbose", action="store_true", help="keep the service's INFO logging")
+    run_parser.set_defaults(func=run)
+
+    record_parser = commands.add_parser("record", help="record live account histories for replay")
+    record_parser.add_argument("path")
+    record_parser.set_defaults(func=record)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
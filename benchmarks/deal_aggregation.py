@@ -0,0 +1,99 @@
+"""Compare the scalar deal loop with the vectorized fold in deal_analytics.
+
+Run from the repository root:
+
+    python -m benchmarks.deal_aggregation [--sizes 10000,100000,1000000]
+
+Every size is checked for identical output before it is timed.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from deal_aggregates import DealAggregate
+from fake_mt5 import SYMBOLS, TradeDeal
+
+
+def synthetic_deals(count, seed=7):
+    rng = random.Random(seed)
+    start = int(datetime(2025, 3, 1).timestamp())
+    times = sorted(rng.randint(start, start + 90 * 86400) for _ in range(count))
+    return tuple(
+        TradeDeal(
+            ticket=i + 1, order=i + 1, time=t, time_msc=t * 1000, type=0, entry=i % 2, magic=0,
+            position_id=i // 2 + 1, reason=0, volume=rng.choice([0.01, 0.1, 0.25, 1.0, 2.5]),
+            price=1.0, commission=0.0, swap=0.0,
+            profit=round(rng.gauss(5, 120), 2) if i % 2 else 0.0,
+            fee=0.0, symbol=rng.choice(SYMBOLS), comment="", external_id=""
+        )
+        for i, t in enumerate(times)
+    )
+
+
+def scalar_aggregate(history_deals):
+    """The per-deal loop of the scalar DealAggregate.fold that deal_analytics replaced.
+
+    Totals are accumulated with += one deal at a time, not with sum(), which
+    uses compensated summation on Python 3.12+ and rounds differently.
+    """
+    total_lots = 0
+    winning_trades = 0
+    losing_trades = 0
+    deal_count = 0
+    daily_profits = {}
+    symbol_trade_count = {}
+    for deal in history_deals:
+        if deal is None:
+            continue
+        total_lots += deal.volume
+        deal_count += 1
+        if deal.profit > 0:
+            winning_trades += 1
+        elif deal.profit < 0:
+            losing_trades += 1
+        day_key = datetime.fromtimestamp(deal.time).strftime('%Y-%m-%d')
+        daily_profits[day_key] = daily_profits.get(day_key, 0) + deal.profit
+        symbol_trade_count[deal.symbol] = symbol_trade_count.get(deal.symbol, 0) + 1
+    return total_lots, winning_trades, losing_trades, deal_count // 2, daily_profits, symbol_trade_count
+
+
+def vectorized_aggregate(history_deals):
+    aggregate = DealAggregate(0)
+    aggregate.fold(history_deals)
+    return (aggregate.total_lots, aggregate.winning_trades, aggregate.losing_trades,
+            aggregate.total_trades, aggregate.daily_profits, aggregate.symbol_trade_count)
+
+
+def best_of(fn, deals, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(deals)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        deals = synthetic_deals(size)
+        # json.dumps of the tuple compares floats by their exact repr and dicts by key order
+        if json.dumps(scalar_aggregate(deals)) != json.dumps(vectorized_aggregate(deals)):
+            raise SystemExit(f"vectorized aggregation differs from the scalar loop for {size} deals")
+        scalar = best_of(scalar_aggregate, deals, args.repeat)
+        vectorized = best_of(vectorized_aggregate, deals, args.repeat)
+        results.append({"deals": size, "scalar_s": round(scalar, 4), "vectorized_s": round(vectorized, 4),
+                        "speedup": round(scalar / vectorized, 2)})
+        print(f"{size:>9} deals  scalar {scalar:8.4f}s  vectorized {vectorized:8.4f}s  x{scalar / vectorized:.1f}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
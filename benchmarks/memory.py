@@ -0,0 +1,150 @@
+"""Compare the poller's per-account memory with dict state against the slotted records.
+
+Run from the repository root:
+
+    python -m benchmarks.memory [--accounts 2000] [--deals 500] [--cycles 3]
+
+Account results and aggregates are produced once with fake_mt5 and pickled
+as a worker would send them. Each layout then runs in a fresh interpreter
+that unpickles them for a few cycles and keeps the latest result,
+aggregate and leaderboard row of every account, as the poller does:
+
+    legacy   registry rows and accounts, results and aggregates as dicts;
+             leaderboard values through safe_decimal's float -> str -> Decimal
+    compact  Account/AccountResult/DealAggregate with __slots__, interned
+             symbol names and plain floats for the leaderboard row
+
+Peak traced allocations (tracemalloc) and peak RSS are reported per layout.
+"""
+import argparse
+import json
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+# The leaderboard row values that used to go through safe_decimal
+NUMERIC_FIELDS = (
+    "balance", "equity", "profit_loss", "return", "lots_traded", "average_lots", "win_rate",
+    "starting_day_balance", "daily_dd_limit", "open_positions", "consistency_score",
+)
+REGISTRY_FIELDS = ("account_id", "server", "password", "contestant_name", "breached", "starting_day_balance", "last_update_time")
+
+
+def produce(path, accounts, deals, seed):
+    """Poll every account once against fake_mt5 and store what the workers would send"""
+    os.environ["MT5_BACKEND"] = "fake_mt5"
+    os.environ["FAKE_MT5_DEALS"] = str(deals)
+    os.environ["FAKE_MT5_SEED"] = str(seed)
+    from deal_aggregates import DealAggregate
+    from mt5_client import mt5, fetch_trading_data
+
+    payloads = []
+    for account_id in range(1000, 1000 + accounts):
+        mt5.initialize(login=account_id, server="Bench-Server", password="bench")
+        aggregate = DealAggregate(account_id)
+        result = fetch_trading_data(str(account_id), f"contestant {account_id}", {str(account_id): 100000.0}, aggregate)
+        mt5.shutdown()
+        payloads.append((result, aggregate))
+    with open(path, "wb") as f:
+        pickle.dump(payloads, f)
+
+
+def measure(path, layout, cycles):
+    from records import Account
+
+    with open(path, "rb") as f:
+        payloads = pickle.load(f)
+    # What crossed the worker pipes in each layout, one blob per account
+    if layout == "legacy":
+        blobs = [pickle.dumps((result.to_dict(), aggregate.__getstate__())) for result, aggregate in payloads]
+    else:
+        blobs = [pickle.dumps((result, aggregate)) for result, aggregate in payloads]
+    account_ids = [result.account_id for result, _ in payloads]
+    del payloads
+
+    tracemalloc.start()
+    registry = {}
+    for account_id in account_ids:
+        row = (account_id, "Bench-Server", "bench", f"contestant {account_id}", False, Decimal("100000"), datetime.now())
+        if layout == "legacy":
+            row = dict(zip(REGISTRY_FIELDS, row))
+            registry[account_id] = {key: row[key] for key in REGISTRY_FIELDS[:-1]}
+        else:
+            registry[account_id] = Account(*row[:5], float(row[5]))
+
+    results, aggregates, rows = {}, {}, {}
+    for _ in range(cycles):
+        for account_id, blob in zip(account_ids, blobs):
+            result, aggregate = pickle.loads(blob)
+            if layout == "legacy":
+                aggregate = SimpleNamespace(**dict(zip(("account_id", "last_deal_time", "last_deal_ticket", "total_lots",
+                                                        "deal_count", "winning_trades", "losing_trades", "daily_profits",
+                                                        "symbol_trade_count", "dirty"), aggregate)))
+                rows[account_id] = tuple(Decimal(str(float(result[name]))) for name in NUMERIC_FIELDS)
+            else:
+                rows[account_id] = (
+                    result.balance, result.equity, result.profit_loss, result.return_pct, result.lots_traded,
+                    result.average_lots, result.win_rate, result.starting_day_balance, result.daily_dd_limit,
+                    result.open_positions, result.consistency_score,
+                )
+            results[account_id] = result
+            aggregates[account_id] = aggregate
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        "layout": layout,
+        "retained_mb": round(current / 2 ** 20, 2),
+        "peak_traced_mb": round(peak / 2 ** 20, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--deals", type=int, default=500, help="deals per account")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--produce", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", choices=["legacy", "compact"], help=argparse.SUPPRESS)
+    parser.add_argument("--payloads", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.produce:
+        produce(args.payloads, args.accounts, args.deals, args.seed)
+        return
+    if args.measure:
+        measure(args.payloads, args.measure, args.cycles)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "payloads.pickle")
+        # Generated in a child too: peak RSS survives exec, so this process must stay small
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.memory", "--produce", "--payloads", path,
+             "--accounts", str(args.accounts), "--deals", str(args.deals), "--seed", str(args.seed)],
+            check=True
+        )
+        results = []
+        for layout in ("legacy", "compact"):
+            # A fresh interpreter per layout so peak RSS isn't shared
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.memory", "--measure", layout, "--payloads", path,
+                 "--cycles", str(args.cycles)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+    for r in results:
+        print(f"{r['layout']:>8}  retained {r['retained_mb']:8.2f} MB  peak traced {r['peak_traced_mb']:8.2f} MB  peak RSS {r['peak_rss_mb']:8.1f} MB")
+    print(json.dumps({"accounts": args.accounts, "deals": args.deals, "cycles": args.cycles, "layouts": results}))
+
+
+if __name__ == "__main__":
+    main()
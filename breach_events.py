@@ -0,0 +1,106 @@
+"""Append-only log of drawdown breaches, written the moment they are detected.
+
+A poll result that breaches is flushed on its own rather than waiting for
+its batch: its events go into breach_events and the leaderboard row is
+written right after. Each event is keyed by account, breach type and
+trading day, so detecting the same breach again (a retry, a second poll
+before the flag is visible) inserts nothing. With a result spool the events
+are stored by its drain, ahead of the leaderboard row and in the same
+retry, so a database outage delays them instead of losing them.
+Subscribers registered with subscribe() are called with every newly stored
+event, and with BREACH_NOTIFY_CHANNEL set the event is also sent with
+pg_notify in the same transaction for listeners outside the process.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from psycopg2.extras import execute_values
+from equity_store import trading_day_start
+from json_encoding import json_default
+
+# Postgres NOTIFY channel for new breach events; unset to skip notifications
+BREACH_NOTIFY_CHANNEL = os.getenv("BREACH_NOTIFY_CHANNEL", "")
+
+
+def breach_event_rows(data):
+    """breach_events rows for the breaches in one poll result"""
+    rows = []
+    for breach in data.breaches:
+        detected_at = datetime.fromisoformat(breach["time"])
+        details = breach["details"]
+        rows.append((
+            str(data.account_id),
+            breach["type"],
+            trading_day_start(detected_at).date(),
+            detected_at,
+            data.contestant_name,
+            float(details["equity"]),
+            float(details.get("daily_dd_limit", details.get("max_drawdown_limit", 0))),
+            json.dumps(details, default=json_default),
+        ))
+    return rows
+
+
+class BreachEventSink:
+    def __init__(self, pool, notify_channel=None):
+        self.pool = pool
+        self.notify_channel = BREACH_NOTIFY_CHANNEL if notify_channel is None else notify_channel
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call callback(event dict) for every breach event stored from now on"""
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def record(self, account_data_list):
+        """Store the breach events of these results, returns the ones that were new"""
+        rows = [row for data in account_data_list for row in breach_event_rows(data)]
+        if not rows:
+            return []
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                inserted = execute_values(cur, """
+                    INSERT INTO breach_events (
+                        account_id, breach_type, trading_day, detected_at,
+                        contestant_name, equity, limit_value, details
+                    ) VALUES %s
+                    ON CONFLICT (account_id, breach_type, trading_day) DO NOTHING
+                    RETURNING id, account_id, breach_type, trading_day, detected_at,
+                              contestant_name, equity, limit_value, details
+                """, rows, template="(%s::numeric, %s, %s, %s, %s, %s, %s, %s::jsonb)", fetch=True)
+                events = [{
+                    "id": event[0],
+                    "account_id": str(event[1]),
+                    "breach_type": event[2],
+                    "trading_day": event[3].isoformat(),
+                    "detected_at": event[4].isoformat(),
+                    "contestant_name": event[5],
+                    "equity": event[6],
+                    "limit": event[7],
+                    "details": event[8],
+                } for event in inserted]
+                if self.notify_channel:
+                    for event in events:
+                        cur.execute("SELECT pg_notify(%s, %s)", (self.notify_channel, json.dumps(event, default=json_default)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+        for event in events:
+            logging.warning(f"Breach recorded for account {event['account_id']}: {event['breach_type']} at equity {event['equity']} (limit {event['limit']})")
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logging.error(f"Breach event subscriber failed: {str(e)}")
+        return events
@@ -0,0 +1,12 @@
+"""Competition rules shared by the poller, scheduler and broker client.
+
+Kept apart from mt5_client so modules that only need the rules don't load
+the MT5 backend.
+"""
+from datetime import datetime
+
+INITIAL_BALANCE = 100000
+START_DATE = datetime(2025, 3, 1)
+# Equity floors as a share of the day's starting balance and of INITIAL_BALANCE
+DAILY_DRAWDOWN = 0.97
+MAX_DRAWDOWN = 0.95
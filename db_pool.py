@@ -0,0 +1,197 @@
+"""Long-lived Postgres connection pool with checkout validation.
+
+Connections are kept open across cycles. A connection that has been idle for
+a while is probed with a cheap SELECT 1 before it is handed out, and only
+connections that turn out to be dead are replaced. Failed connection attempts
+back off exponentially so an unreachable database isn't hammered.
+"""
+import logging
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+# Idle connections older than this (seconds) are probed before being handed out
+PROBE_AFTER_IDLE = 30
+# Exponential backoff between failed connection attempts (seconds)
+BACKOFF_INITIAL = 1
+BACKOFF_MAX = 60
+
+
+class ManagedConnectionPool:
+    def __init__(self, minconn, maxconn, checkout_timeout=30, lazy=False, **db_config):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.db_config = db_config
+        self._idle = []  # (connection, monotonic time it was returned)
+        self._in_use = set()
+        self._opening = 0  # slots reserved by checkouts probing or connecting outside the lock
+        self._cond = threading.Condition()
+        self._closed = False
+        self._backoff = 0
+        self._next_attempt = 0
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.reconnects = 0
+        self.connect_failures = 0
+
+        if not lazy:
+            self.warm()
+
+    def warm(self):
+        """Open connections until minconn are idle; a lazy pool connects here or on first checkout"""
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) + len(self._in_use) + self._opening >= self.minconn:
+                    return
+                self._opening += 1
+            conn = None
+            try:
+                conn = self._connect()
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if conn is not None:
+                        if self._closed:
+                            self._discard(conn)
+                        else:
+                            self._idle.append((conn, time.monotonic()))
+                    self._cond.notify_all()
+
+    def _connect(self):
+        # Called without the lock held; only the backoff bookkeeping takes it
+        with self._cond:
+            now = time.monotonic()
+            if now < self._next_attempt:
+                raise psycopg2.pool.PoolError(
+                    f"database unavailable, next connection attempt in {self._next_attempt - now:.1f}s"
+                )
+        try:
+            conn = psycopg2.connect(**self.db_config)
+        except psycopg2.Error:
+            with self._cond:
+                self.connect_failures += 1
+                self._backoff = min(BACKOFF_MAX, self._backoff * 2 if self._backoff else BACKOFF_INITIAL)
+                self._next_attempt = time.monotonic() + self._backoff
+            raise
+        with self._cond:
+            self._backoff = 0
+            self._next_attempt = 0
+        return conn
+
+    def _alive(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - idle_since < PROBE_AFTER_IDLE:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reserve(self, deadline):
+        """Under the lock: wait for an idle connection or a free slot and hold it, returns (conn, idle_since)"""
+        while True:
+            if self._closed:
+                raise psycopg2.pool.PoolError("connection pool is closed")
+            if self._idle:
+                candidate, idle_since = self._idle.pop()
+                break
+            if len(self._in_use) + self._opening < self.maxconn:
+                candidate = idle_since = None
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise psycopg2.pool.PoolError(f"no database connection available after {self.checkout_timeout}s")
+            self._cond.wait(remaining)
+        # Counted against maxconn while it is probed or opened outside the lock
+        self._opening += 1
+        return candidate, idle_since
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        while True:
+            with self._cond:
+                candidate, idle_since = self._reserve(deadline)
+
+            # Probing a stale connection or opening a new one can take as long
+            # as the network does, so it happens without blocking other threads
+            conn = None
+            try:
+                if candidate is None:
+                    conn = self._connect()
+                elif self._alive(candidate, idle_since):
+                    conn = candidate
+                else:
+                    logging.warning("Discarding dead database connection from pool")
+                    self._discard(candidate)
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if conn is None:
+                        if candidate is not None:
+                            self.reconnects += 1
+                        self._cond.notify()
+                    elif self._closed:
+                        self._discard(conn)
+                        conn = None
+                    else:
+                        self._in_use.add(conn)
+                        waited = time.monotonic() - started
+                        self.checkouts += 1
+                        self.checkout_wait_total += waited
+                        self.checkout_wait_max = max(self.checkout_wait_max, waited)
+            if conn is not None:
+                return conn
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            self._in_use.discard(conn)
+            if not close and not self._closed and not conn.closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self._idle.append((conn, time.monotonic()))
+                except psycopg2.Error:
+                    self._discard(conn)
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            for conn in self._in_use:
+                self._discard(conn)
+            self._idle = []
+            self._in_use = set()
+            self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "checkout_wait_avg": self.checkout_wait_total / self.checkouts if self.checkouts else 0.0,
+                "checkout_wait_max": self.checkout_wait_max,
+                "reconnects": self.reconnects,
+                "connect_failures": self.connect_failures,
+            }
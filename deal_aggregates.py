@@ -0,0 +1,88 @@
+import sys
+from datetime import datetime, timedelta
+from deal_analytics import fold_into
+from records import intern_counts
+
+# Deals are re-requested from a little before the stored cursor so that clock
+# differences between the terminal and the broker server can't drop a deal.
+# Anything at or before the cursor is filtered out again by (time, ticket).
+CURSOR_OVERLAP = timedelta(days=1)
+
+
+class DealAggregate:
+    """Running totals over one account's deal history plus the cursor of the last folded deal"""
+    __slots__ = (
+        "account_id", "last_deal_time", "last_deal_ticket", "total_lots", "deal_count",
+        "winning_trades", "losing_trades", "daily_profits", "symbol_trade_count", "dirty",
+    )
+
+    def __init__(self, account_id, last_deal_time=0, last_deal_ticket=0, total_lots=0,
+                 deal_count=0, winning_trades=0, losing_trades=0,
+                 daily_profits=None, symbol_trade_count=None):
+        self.account_id = str(account_id)
+        self.last_deal_time = int(last_deal_time or 0)
+        self.last_deal_ticket = int(last_deal_ticket or 0)
+        self.total_lots = total_lots
+        self.deal_count = int(deal_count or 0)
+        self.winning_trades = int(winning_trades or 0)
+        self.losing_trades = int(losing_trades or 0)
+        self.daily_profits = {sys.intern(day): total for day, total in (daily_profits or {}).items()}
+        self.symbol_trade_count = intern_counts(symbol_trade_count or {})
+        self.dirty = False
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+        # Day keys and symbol names come back from the worker as fresh copies
+        self.daily_profits = {sys.intern(day): total for day, total in self.daily_profits.items()}
+        self.symbol_trade_count = intern_counts(self.symbol_trade_count)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            row["account_id"],
+            last_deal_time=row["last_deal_time"],
+            last_deal_ticket=row["last_deal_ticket"],
+            total_lots=float(row["total_lots"]),
+            deal_count=row["deal_count"],
+            winning_trades=row["winning_trades"],
+            losing_trades=row["losing_trades"],
+            daily_profits={k: float(v) for k, v in (row["daily_profits"] or {}).items()},
+            symbol_trade_count={k: int(v) for k, v in (row["symbol_trade_counts"] or {}).items()},
+        )
+
+    def reset(self):
+        """Drop all totals so the next fold starts again from START_DATE"""
+        self.__init__(self.account_id)
+        self.dirty = True
+
+    def history_start(self, start_date):
+        """Earliest deal time that still has to be requested from the terminal"""
+        if not self.last_deal_time:
+            return start_date
+        return max(start_date, datetime.fromtimestamp(self.last_deal_time) - CURSOR_OVERLAP)
+
+    def fold(self, deals):
+        """Fold deals newer than the cursor into the totals, returns how many were new"""
+        return fold_into(self, deals)
+
+    @property
+    def total_trades(self):
+        # An opening and a closing deal make up one trade
+        return self.deal_count // 2
+
+    def to_row(self):
+        return {
+            "account_id": self.account_id,
+            "last_deal_time": self.last_deal_time,
+            "last_deal_ticket": self.last_deal_ticket,
+            "total_lots": self.total_lots,
+            "deal_count": self.deal_count,
+            "winning_trades": self.winning_trades,
+            "losing_trades": self.losing_trades,
+            "daily_profits": self.daily_profits,
+            "symbol_trade_counts": self.symbol_trade_count,
+        }
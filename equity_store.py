@@ -0,0 +1,169 @@
+"""Per-poll equity time series and the day-open balance derived from it.
+
+Every account poll leaves one (account_id, ts, equity, balance) row in
+equity_snapshots. Rows are buffered by the poller and written in bulk with
+the leaderboard batches. Once they are older than DOWNSAMPLE_AFTER the
+series is thinned to the last sample per DOWNSAMPLE_BUCKET, and everything
+older than RETENTION is dropped.
+
+A trading day starts at DAY_ROLLOVER. The day-open balance is taken from the
+series on an account's first poll of a new trading day: of its last sample
+before the rollover and the current one, whichever lies closer to the
+rollover. A poll that misses the old 3:30-3:35 window therefore still sets
+the starting day balance.
+"""
+import logging
+import os
+import threading
+import time as _time
+from datetime import datetime, time, timedelta
+from psycopg2.extras import execute_values
+
+# Local time at which a new trading day (and its drawdown limit) begins
+DAY_ROLLOVER = time(3, 30)
+# Samples older than this are thinned to one per bucket
+DOWNSAMPLE_AFTER = timedelta(hours=int(os.getenv("EQUITY_DOWNSAMPLE_AFTER_HOURS", "48")))
+DOWNSAMPLE_BUCKET = int(os.getenv("EQUITY_DOWNSAMPLE_BUCKET_SECONDS", "900"))
+# Samples older than this are deleted
+RETENTION = timedelta(days=int(os.getenv("EQUITY_RETENTION_DAYS", "35")))
+# Seconds between retention/downsampling passes
+COMPACT_INTERVAL = 3600
+INSERT_PAGE_SIZE = 1000
+
+# Postgres' epoch for timestamps without time zone, which the buckets are counted from
+_EPOCH = datetime(1970, 1, 1)
+
+
+def trading_day_start(moment):
+    """The rollover that opened the trading day containing moment"""
+    start = datetime.combine(moment.date(), DAY_ROLLOVER)
+    return start if moment >= start else start - timedelta(days=1)
+
+
+def day_open_balance(last_sample, now, equity):
+    """Day-open balance if this poll is the account's first of a trading day, else None.
+
+    last_sample is the (ts, equity) of the account's previous poll. Without
+    one there is nothing to tell a rollover from a first sighting, so the
+    stored starting day balance is kept.
+    """
+    if last_sample is None:
+        return None
+    rollover = trading_day_start(now)
+    last_ts, last_equity = last_sample
+    if last_ts >= rollover:
+        return None
+    balance = float(last_equity if rollover - last_ts < now - rollover else equity)
+    return balance if balance > 0 else None
+
+
+def _bucket_floor(moment):
+    seconds = (moment - _EPOCH).total_seconds()
+    return _EPOCH + timedelta(seconds=seconds - seconds % DOWNSAMPLE_BUCKET)
+
+
+class EquityStore:
+    def __init__(self, pool):
+        self.pool = pool
+        self.last_samples = {}  # account_id -> (ts, equity) of its latest poll
+        self.pending = []
+        self.lock = threading.Lock()
+        self.last_compaction = None
+        self.compacted_until = None
+
+    def load(self, account_ids=None):
+        """Pick up every account's latest sample so rollovers survive a restart.
+
+        With account_ids only those accounts are reloaded, e.g. after another
+        node polled them.
+        """
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT DISTINCT ON (account_id) account_id, ts, equity
+                    FROM equity_snapshots
+                    WHERE ts >= %s AND (%s::numeric[] IS NULL OR account_id = ANY(%s::numeric[]))
+                    ORDER BY account_id, ts DESC
+                """, (datetime.now() - RETENTION, account_ids, account_ids))
+                rows = cur.fetchall()
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+        if account_ids is None:
+            self.last_samples = {}
+        else:
+            for account_id in account_ids:
+                self.last_samples.pop(str(account_id), None)
+        self.last_samples.update((str(account_id), (ts, equity)) for account_id, ts, equity in rows)
+        logging.info(f"Equity store loaded the latest samples of {len(rows)} accounts")
+
+    def last_sample(self, account_id):
+        return self.last_samples.get(str(account_id))
+
+    def record(self, data):
+        """Queue the sample of one poll result for the next write"""
+        account_id = str(data.account_id)
+        sample = (data.polled_at, data.equity)
+        self.last_samples[account_id] = sample
+        with self.lock:
+            self.pending.append((account_id, sample[0], sample[1], data.balance))
+
+    def write(self):
+        """Insert every queued sample in one statement, returns the number written"""
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return 0
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO equity_snapshots (account_id, ts, equity, balance)
+                    VALUES %s
+                    ON CONFLICT (account_id, ts) DO NOTHING
+                """, rows, template="(%s::numeric, %s, %s, %s)", page_size=INSERT_PAGE_SIZE)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with self.lock:
+                # Keep the samples for the next write instead of losing them
+                self.pending[:0] = rows
+            raise
+        finally:
+            self.pool.putconn(conn)
+        return len(rows)
+
+    def compact(self, force=False):
+        """Apply retention and downsampling at most once per COMPACT_INTERVAL"""
+        if not force and self.last_compaction is not None and _time.monotonic() - self.last_compaction < COMPACT_INTERVAL:
+            return False
+        now = datetime.now()
+        downsample_before = _bucket_floor(now - DOWNSAMPLE_AFTER)
+        # Buckets before the previous pass's cutoff are already down to one row
+        downsample_from = self.compacted_until or datetime.min
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM equity_snapshots WHERE ts < %s", (now - RETENTION,))
+                expired = cur.rowcount
+                cur.execute("""
+                    DELETE FROM equity_snapshots AS s
+                    USING (
+                        SELECT account_id, ts, row_number() OVER (
+                            PARTITION BY account_id, floor(extract(epoch FROM ts) / %s)
+                            ORDER BY ts DESC
+                        ) AS n
+                        FROM equity_snapshots
+                        WHERE ts >= %s AND ts < %s
+                    ) AS d
+                    WHERE s.account_id = d.account_id AND s.ts = d.ts AND d.n > 1
+                """, (DOWNSAMPLE_BUCKET, downsample_from, downsample_before))
+                thinned = cur.rowcount
+            conn.commit()
+        finally:
+            self.pool.putconn(conn)
+        self.last_compaction = _time.monotonic()
+        self.compacted_until = downsample_before
+        logging.info(f"Equity store compaction: {expired} expired and {thinned} downsampled samples removed")
+        return True
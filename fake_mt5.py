@@ -0,0 +1,209 @@
+"""Simulated stand-in for the MetaTrader5 module.
+
+Select it with MT5_BACKEND=fake_mt5 to exercise the poller without a
+terminal or live broker accounts. Every login gets a deterministic account
+and deal history derived from FAKE_MT5_SEED, so repeated runs see the same
+data. Behaviour is configured through environment variables so that worker
+processes pick up the same settings:
+
+    FAKE_MT5_SEED           base seed for the generated data (default 1)
+    FAKE_MT5_DEALS          deals generated per account (default 200)
+    FAKE_MT5_LATENCY        seconds slept on every API call (default 0)
+    FAKE_MT5_STARTUP_LATENCY extra seconds for initialize to start the terminal
+                            (default 0)
+    FAKE_MT5_LOGIN_LATENCY  extra seconds to authorize an account, through
+                            initialize or login (default 0)
+    FAKE_MT5_DEAL_LATENCY   extra seconds per deal returned by history_deals_get
+    FAKE_MT5_JITTER         relative random spread applied to every delay (e.g. 0.2)
+    FAKE_MT5_FAIL_LOGINS    comma separated logins whose authorization fails
+    FAKE_MT5_HANG_LOGINS    comma separated logins whose initialize never returns
+    FAKE_MT5_REPLAY         JSON file of recorded accounts (see
+                            benchmarks/cycle.py record) served instead of
+                            generated data; unknown logins fail authorization
+"""
+import json
+import os
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+
+AccountInfo = namedtuple("AccountInfo", ["login", "server", "currency", "balance", "equity", "profit", "margin", "margin_free"])
+TradePosition = namedtuple("TradePosition", ["ticket", "time", "symbol", "type", "volume", "price_open", "profit"])
+TradeDeal = namedtuple("TradeDeal", [
+    "ticket", "order", "time", "time_msc", "type", "entry", "magic", "position_id", "reason",
+    "volume", "price", "commission", "swap", "profit", "fee", "symbol", "comment", "external_id"
+])
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD", "BTCUSD", "US30", "NAS100"]
+HISTORY_START = datetime(2025, 3, 1)
+
+_session = None
+_terminal_started = False
+_last_error = (1, "Success")
+_accounts = {}
+
+
+def _env_logins(name):
+    return {int(x) for x in os.getenv(name, "").split(",") if x.strip()}
+
+
+def _latency(extra=0.0):
+    delay = float(os.getenv("FAKE_MT5_LATENCY", "0")) + extra
+    if delay > 0:
+        jitter = float(os.getenv("FAKE_MT5_JITTER", "0"))
+        time.sleep(delay * random.uniform(1 - jitter, 1 + jitter) if jitter else delay)
+
+
+_replay = None
+
+
+def _replayed_accounts():
+    """Recorded accounts from FAKE_MT5_REPLAY keyed by login, or None when not replaying"""
+    global _replay
+    path = os.getenv("FAKE_MT5_REPLAY")
+    if not path:
+        return None
+    if _replay is None:
+        with open(path) as f:
+            recorded = json.load(f)["accounts"]
+        _replay = {}
+        for login, account in recorded.items():
+            deals = sorted(
+                (TradeDeal(**{field: deal.get(field, 0) for field in TradeDeal._fields}) for deal in account["deals"]),
+                key=lambda deal: (deal.time, deal.ticket)
+            )
+            positions = tuple(
+                TradePosition(**{field: position.get(field, 0) for field in TradePosition._fields})
+                for position in account["positions"]
+            )
+            _replay[int(login)] = {
+                "balance": account["balance"],
+                "equity": account["equity"],
+                "deals": deals,
+                "positions": positions,
+            }
+    return _replay
+
+
+def _account(login):
+    """Generate (once per process) the deterministic state of one account"""
+    if login in _accounts:
+        return _accounts[login]
+    replayed = _replayed_accounts()
+    if replayed is not None:
+        _accounts[login] = replayed[login]
+        return replayed[login]
+
+    rng = random.Random(int(os.getenv("FAKE_MT5_SEED", "1")) * 1000003 + login)
+    start = int(HISTORY_START.timestamp())
+    end = int(time.time())
+    deal_count = int(os.getenv("FAKE_MT5_DEALS", "200"))
+    deals = []
+    balance = 100000.0
+    times = sorted(rng.randint(start, end) for _ in range(deal_count))
+    for i, deal_time in enumerate(times):
+        closing = i % 2 == 1
+        profit = round(rng.gauss(15, 250), 2) if closing else 0.0
+        balance += profit
+        ticket = login * 1000000 + i + 1
+        deals.append(TradeDeal(
+            ticket=ticket, order=ticket, time=deal_time, time_msc=deal_time * 1000,
+            type=rng.randint(0, 1), entry=1 if closing else 0, magic=0,
+            position_id=login * 1000000 + i // 2 + 1, reason=0,
+            volume=round(rng.choice([0.01, 0.1, 0.5, 1.0, 2.0]) * rng.randint(1, 5), 2),
+            price=round(rng.uniform(1, 2000), 5), commission=0.0, swap=0.0,
+            profit=profit, fee=0.0, symbol=rng.choice(SYMBOLS), comment="", external_id=""
+        ))
+
+    positions = tuple(
+        TradePosition(ticket=login * 10 + n, time=end, symbol=rng.choice(SYMBOLS), type=0,
+                      volume=1.0, price_open=1.0, profit=round(rng.gauss(0, 200), 2))
+        for n in range(rng.randint(0, 3))
+    )
+    state = {"balance": round(balance, 2), "deals": deals, "positions": positions}
+    _accounts[login] = state
+    return state
+
+
+def initialize(path=None, login=None, password=None, server=None, timeout=None, portable=False):
+    global _session, _terminal_started, _last_error
+    startup = 0.0 if _terminal_started else float(os.getenv("FAKE_MT5_STARTUP_LATENCY", "0"))
+    _terminal_started = True
+    if login is None:
+        _latency(startup)
+        _session = None
+        _last_error = (1, "Success")
+        return True
+    return _authorize(login, server, startup)
+
+
+def _authorize(login, server, extra_latency=0.0):
+    global _session, _last_error
+    _latency(extra_latency + float(os.getenv("FAKE_MT5_LOGIN_LATENCY", "0")))
+    login = int(login)
+    if login in _env_logins("FAKE_MT5_HANG_LOGINS"):
+        while True:
+            time.sleep(3600)
+    replayed = _replayed_accounts()
+    if login in _env_logins("FAKE_MT5_FAIL_LOGINS") or (replayed is not None and login not in replayed):
+        _session = None
+        _last_error = (-6, "Terminal: Authorization failed")
+        return False
+    _session = {"login": login, "server": server}
+    _last_error = (1, "Success")
+    return True
+
+
+def login(login, password=None, server=None, timeout=None):
+    global _last_error
+    if not _terminal_started:
+        _latency()
+        _last_error = (-10004, "No IPC connection")
+        return False
+    return _authorize(login, server)
+
+
+def shutdown():
+    global _session, _terminal_started
+    _session = None
+    _terminal_started = False
+    return True
+
+
+def last_error():
+    return _last_error
+
+
+def account_info():
+    global _last_error
+    _latency()
+    if _session is None:
+        _last_error = (-10004, "No IPC connection")
+        return None
+    state = _account(_session["login"])
+    floating = sum(p.profit for p in state["positions"])
+    equity = state.get("equity", round(state["balance"] + floating, 2))
+    return AccountInfo(login=_session["login"], server=_session["server"], currency="USD",
+                       balance=state["balance"], equity=equity, profit=round(floating, 2),
+                       margin=0.0, margin_free=equity)
+
+
+def positions_get(*args, **kwargs):
+    _latency()
+    if _session is None:
+        return None
+    return _account(_session["login"])["positions"]
+
+
+def history_deals_get(date_from, date_to, *args, **kwargs):
+    global _last_error
+    if _session is None:
+        _latency()
+        _last_error = (-10004, "No IPC connection")
+        return None
+    lo = int(date_from.timestamp()) if isinstance(date_from, datetime) else int(date_from)
+    hi = int(date_to.timestamp()) if isinstance(date_to, datetime) else int(date_to)
+    deals = tuple(deal for deal in _account(_session["login"])["deals"] if lo <= deal.time <= hi)
+    _latency(len(deals) * float(os.getenv("FAKE_MT5_DEAL_LATENCY", "0")))
+    return deals
@@ -0,0 +1,238 @@
+"""Wall-clock timing of the phases of a polling cycle and the metrics built on it.
+
+Code on the hot path wraps each stage in ``with phase("name"):`` and bumps
+event counters with ``count("name")``. Both go to the active PhaseTimer: the
+poller starts one per cycle and each MT5 worker starts one per account,
+shipping a snapshot back with the account's result.
+
+The poller folds every finished cycle into ``metrics``, which keeps phase
+histograms, counters and the last per-account timings. They are served in
+Prometheus text format on METRICS_PORT (/metrics, or /metrics.json) and can
+also be dumped to METRICS_JSON_PATH after every cycle.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port of the metrics endpoint (0 disables it) and the interface it binds to
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# File rewritten with the JSON metrics after every cycle, if set
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH")
+
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def snapshot(self):
+        return {"phases": dict(self.phases), "counts": dict(self.counts)}
+
+
+_active = PhaseTimer()
+
+
+def begin():
+    """Start collecting into a fresh timer and return it"""
+    global _active
+    _active = PhaseTimer()
+    return _active
+
+
+def phase(name):
+    return _active.phase(name)
+
+
+def count(name, amount=1):
+    _active.count(name, amount)
+
+
+class Histogram:
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.total,
+            "sum": round(self.sum, 6),
+            "buckets": {str(bound): n for bound, n in zip(self.buckets, self.counts)},
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cycle_seconds = Histogram()
+        self.cycle_phase_seconds = {}    # poller phase -> Histogram
+        self.account_phase_seconds = {}  # worker phase -> Histogram over all accounts
+        self.account_last = {}           # account_id -> {phase: seconds} from its latest poll
+        self.login_seconds = {}          # broker server -> Histogram of login latency
+        self.counters = {}
+        self.gauges = {}
+        self.last_cycle = None
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe_login(self, server, seconds):
+        with self.lock:
+            self.login_seconds.setdefault(server, Histogram()).observe(seconds)
+
+    def record_cycle(self, report, budget):
+        """Fold one run_cycle report in; returns True when the cycle overran its budget"""
+        overrun = report["duration"] > budget
+        with self.lock:
+            self.cycle_seconds.observe(report["duration"])
+            for name, seconds in report["phases"].items():
+                self.cycle_phase_seconds.setdefault(name, Histogram()).observe(seconds)
+            for account_id, phases in report["account_phases"].items():
+                for name, seconds in phases.items():
+                    self.account_phase_seconds.setdefault(name, Histogram()).observe(seconds)
+                self.account_last[account_id] = dict(phases)
+            for name, amount in report["counts"].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+            self.counters["cycles"] = self.counters.get("cycles", 0) + 1
+            if overrun:
+                self.counters["cycle_overruns"] = self.counters.get("cycle_overruns", 0) + 1
+            self.gauges["last_cycle_seconds"] = report["duration"]
+            self.gauges["accounts_polled"] = report["accounts_polled"]
+            self.gauges["accounts_updated"] = report["accounts_updated"]
+            self.gauges["last_cycle_timestamp"] = time.time()
+            self.last_cycle = {
+                "duration": report["duration"],
+                "overrun": overrun,
+                "phases": dict(report["phases"]),
+            }
+        return overrun
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "cycle_seconds": self.cycle_seconds.to_dict(),
+                "cycle_phase_seconds": {name: h.to_dict() for name, h in self.cycle_phase_seconds.items()},
+                "account_phase_seconds": {name: h.to_dict() for name, h in self.account_phase_seconds.items()},
+                "account_last_phase_seconds": {k: dict(v) for k, v in self.account_last.items()},
+                "login_seconds": {server: h.to_dict() for server, h in self.login_seconds.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "last_cycle": self.last_cycle,
+            }
+
+    def render_prometheus(self):
+        lines = []
+
+        def histogram(name, help_text, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in histograms:
+                for bound, n in zip(h.buckets, h.counts):
+                    lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {n}')
+                lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {h.total}')
+                suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {h.sum}")
+                lines.append(f"{name}_count{suffix} {h.total}")
+
+        with self.lock:
+            histogram("ttz_cycle_seconds", "Duration of a full polling cycle", [("", self.cycle_seconds)])
+            histogram("ttz_cycle_phase_seconds", "Time spent per cycle in each poller phase",
+                      [(f'phase="{name}",', h) for name, h in sorted(self.cycle_phase_seconds.items())])
+            histogram("ttz_account_phase_seconds", "Time spent per account in each MT5 worker phase",
+                      [(f'phase="{name}",', h) for name, h in sorted(self.account_phase_seconds.items())])
+            histogram("ttz_login_seconds", "MT5 login latency per broker server",
+                      [(f'server="{server}",', h) for server, h in sorted(self.login_seconds.items())])
+
+            lines.append("# HELP ttz_account_last_phase_seconds Phase timings of each account's latest poll")
+            lines.append("# TYPE ttz_account_last_phase_seconds gauge")
+            for account_id, phases in sorted(self.account_last.items()):
+                for name, seconds in sorted(phases.items()):
+                    lines.append(f'ttz_account_last_phase_seconds{{account_id="{account_id}",phase="{name}"}} {seconds}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE ttz_{name}_total counter")
+                lines.append(f"ttz_{name}_total {value}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE ttz_{name} gauge")
+                lines.append(f"ttz_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(metrics.to_dict()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=None, host=None):
+    """Serve the metrics endpoint from a daemon thread, returns the server or None when disabled"""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host or METRICS_HOST, port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"Could not start metrics endpoint on port {port}: {str(e)}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host or METRICS_HOST}:{port}/metrics")
+    return server
@@ -0,0 +1,16 @@
+"""JSON encoding for spooled results, breach events and API responses.
+
+Values may still be Decimal (read back from numeric columns) or datetime;
+both are written as plain JSON numbers and ISO strings.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+
+def json_default(obj):
+    """default= hook for json.dumps"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,52 @@
+"""Exponential backoff for accounts whose credentials the broker rejects.
+
+An account that fails authorization is not offered to the workers again
+until its backoff has passed: BASE_DELAY after the first failure, doubling
+with every further failure up to MAX_DELAY. The backoff is tied to the
+server and password it failed with, so fixing the credentials in the
+leaderboard table makes the account eligible on the next refresh.
+"""
+import logging
+import os
+import time
+
+# Seconds an account sits out after its first rejected login, and the cap
+BASE_DELAY = float(os.getenv("LOGIN_BACKOFF_BASE", "120"))
+MAX_DELAY = float(os.getenv("LOGIN_BACKOFF_MAX", "3600"))
+
+
+class LoginBackoff:
+    def __init__(self, base_delay=None, max_delay=None):
+        self.base_delay = BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = MAX_DELAY if max_delay is None else max_delay
+        self.entries = {}  # account_id -> (credentials, failures, retry_at)
+
+    @staticmethod
+    def _credentials(account):
+        return (account.server, account.password)
+
+    def blocked(self, account, now=None):
+        entry = self.entries.get(str(account.account_id))
+        if entry is None:
+            return False
+        credentials, failures, retry_at = entry
+        if credentials != self._credentials(account):
+            # New credentials deserve a fresh attempt
+            del self.entries[str(account.account_id)]
+            return False
+        return (now if now is not None else time.monotonic()) < retry_at
+
+    def record(self, account, login_failed, now=None):
+        account_id = str(account.account_id)
+        if not login_failed:
+            self.entries.pop(account_id, None)
+            return
+        now = now if now is not None else time.monotonic()
+        previous = self.entries.get(account_id)
+        failures = previous[1] + 1 if previous and previous[0] == self._credentials(account) else 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        self.entries[account_id] = (self._credentials(account), failures, now + delay)
+        logging.warning(f"Login for account {account_id} rejected {failures} time(s) in a row, not retrying for {delay:.0f}s")
+
+    def backed_off(self):
+        return len(self.entries)
@@ -0,0 +1,216 @@
+import importlib
+import logging
+import os
+from datetime import datetime
+from competition import DAILY_DRAWDOWN, INITIAL_BALANCE, MAX_DRAWDOWN, START_DATE
+from deal_aggregates import DealAggregate
+from equity_store import day_open_balance
+from instrumentation import count, phase
+from records import AccountResult
+
+# Broker API module; set MT5_BACKEND=fake_mt5 to run against the simulated terminal
+mt5 = importlib.import_module(os.getenv("MT5_BACKEND", "MetaTrader5"))
+
+# Keep each worker's terminal running and switch accounts with mt5.login
+# instead of a full initialize/shutdown per account (MT5_SESSION_REUSE=0 to disable)
+MT5_SESSION_REUSE = os.getenv("MT5_SESSION_REUSE", "1") != "0"
+# last_error() code of rejected credentials, as opposed to terminal/IPC trouble
+AUTH_FAILED = -6
+
+def connect_to_mt5(account, path=None):
+    # Each worker process drives its own terminal installation when a path is given
+    terminal = {"path": path} if path else {}
+    with phase("connect"):
+        connected = mt5.initialize(login=int(account.account_id), 
+                                   server=account.server, 
+                                   password=account.password,
+                                   **terminal)
+    if connected:
+        logging.info(f"Connected to account {account.account_id}")
+        return True
+    logging.error(f"Failed to connect to account {account.account_id}: {mt5.last_error()}")
+    count("failed_logins")
+    return False
+
+class TerminalSession:
+    """One worker's terminal, initialized once and logged into account after account"""
+
+    def __init__(self, path=None, reuse=None):
+        self.path = path
+        self.reuse = MT5_SESSION_REUSE if reuse is None else reuse
+        self.initialized = False
+
+    def _initialize(self):
+        terminal = {"path": self.path} if self.path else {}
+        with phase("initialize"):
+            self.initialized = bool(mt5.initialize(**terminal))
+        if not self.initialized:
+            logging.error(f"Failed to start the MT5 terminal: {mt5.last_error()}")
+        return self.initialized
+
+    def login(self, account):
+        if not self.reuse:
+            self.initialized = connect_to_mt5(account, self.path)
+            return self.initialized
+
+        for attempt in range(2):
+            if not self.initialized and not self._initialize():
+                break
+            with phase("connect"):
+                logged_in = mt5.login(int(account.account_id),
+                                      password=account.password,
+                                      server=account.server)
+            if logged_in:
+                logging.info(f"Connected to account {account.account_id}")
+                return True
+            error = mt5.last_error()
+            if error[0] == AUTH_FAILED:
+                logging.error(f"Failed to connect to account {account.account_id}: {error}")
+                count("failed_logins")
+                return False
+            # Not the credentials: the terminal stopped answering, restart it once
+            logging.warning(f"MT5 terminal error logging into account {account.account_id}: {error}, restarting terminal")
+            self.reset()
+        count("terminal_errors")
+        return False
+
+    def release(self):
+        """Done with the current account; only a non-reused session shuts down"""
+        if not self.reuse:
+            self.reset()
+
+    def reset(self):
+        with phase("shutdown"):
+            mt5.shutdown()
+        self.initialized = False
+
+
+def fetch_trading_data(account_id, contestant_name, starting_day_balances, aggregate=None, last_sample=None):
+    """Modified to accept pre-fetched starting day balances.
+
+    When an aggregate is given only deals newer than its cursor are pulled and
+    folded into it; without one the whole history since START_DATE is used.
+    last_sample is the account's previous (time, equity) poll, used to set
+    the starting day balance on its first poll of a trading day.
+    """
+    try:
+        with phase("account_info"):
+            account_info = mt5.account_info()
+        if not account_info:
+            logging.error(f"Failed to get account info for {account_id}: {mt5.last_error()}")
+            count("account_info_failures")
+            return None
+
+        with phase("positions"):
+            positions = mt5.positions_get()
+        open_positions_count = len(positions) if positions is not None else 0
+        now = datetime.now()
+        
+        # Use pre-fetched starting day balance with validation
+        starting_day_balance = starting_day_balances.get(str(account_id))
+        if starting_day_balance is None:
+            logging.warning(f"No starting day balance found for account {account_id}, using INITIAL_BALANCE")
+            starting_day_balance = INITIAL_BALANCE
+        
+        # First poll of a new trading day: take the day-open balance from the
+        # equity series; the poller persists it with the leaderboard row
+        day_open_captured = False
+        new_balance = day_open_balance(last_sample, now, account_info.equity)
+        if new_balance is not None:
+            starting_day_balance = new_balance
+            day_open_captured = True
+
+        # Calculate daily drawdown limit with null check
+        daily_dd_limit = round(float(starting_day_balance) * DAILY_DRAWDOWN, 2) if starting_day_balance is not None else round(INITIAL_BALANCE * DAILY_DRAWDOWN, 2)
+
+        if aggregate is None:
+            aggregate = DealAggregate(account_id)
+
+        with phase("history"):
+            history_deals = mt5.history_deals_get(aggregate.history_start(START_DATE), now)
+        if history_deals is None:
+            logging.error(f"Failed to get history deals for {account_id}: {mt5.last_error()}")
+            count("history_failures")
+            history_deals = []
+
+        with phase("aggregation"):
+            aggregate.fold(history_deals)
+        total_lots = aggregate.total_lots
+        winning_trades = aggregate.winning_trades
+        losing_trades = aggregate.losing_trades
+        total_trades = aggregate.total_trades
+        daily_profits = aggregate.daily_profits
+        symbol_trade_count = dict(aggregate.symbol_trade_count)
+
+        # Calculate consistency score
+        total_profits = sum(daily_profits.values())
+        highest_profit_day = max(daily_profits.values()) if daily_profits else 0
+        consistency_score = round((highest_profit_day / total_profits * 100), 2) if total_profits != 0 else 0
+
+        profit_loss = account_info.balance - INITIAL_BALANCE
+
+        # Calculate average lots traded
+        average_lots = round(total_lots / total_trades, 2) if total_trades > 0 else 0
+
+        # Find most traded symbol and its count
+        most_traded_symbol = max(symbol_trade_count.items(), key=lambda x: x[1], default=(None, 0))
+
+        # Check for breaches
+        breaches = []
+        is_breached = False
+        if daily_dd_limit is not None and account_info.equity < daily_dd_limit:
+            breaches.append({
+                "time": now.isoformat(),
+                "type": "daily_drawdown",
+                "details": {
+                    "account_id": account_id,
+                    "contestant_name": contestant_name,
+                    "equity": account_info.equity,
+                    "daily_dd_limit": daily_dd_limit
+                }
+            })
+            is_breached = True
+        elif account_info.equity < INITIAL_BALANCE * MAX_DRAWDOWN:
+            breaches.append({
+                "time": now.isoformat(),
+                "type": "max_drawdown",
+                "details": {
+                    "account_id": account_id,
+                    "contestant_name": contestant_name,
+                    "equity": account_info.equity,
+                    "max_drawdown_limit": INITIAL_BALANCE * MAX_DRAWDOWN
+                }
+            })
+            is_breached = True
+
+        # Set balance equal to equity if breached
+        final_balance = account_info.equity if is_breached else account_info.balance
+
+        return AccountResult(
+            account_id=account_id,
+            contestant_name=contestant_name,
+            balance=float(final_balance),  # Using the adjusted balance
+            equity=float(account_info.equity),
+            profit_loss=round(profit_loss, 2),
+            return_pct=round((profit_loss / INITIAL_BALANCE * 100), 2),
+            lots_traded=round(total_lots, 2),
+            average_lots=average_lots,
+            most_traded_symbol=most_traded_symbol[0],
+            symbol_trade_counts=symbol_trade_count,  # Add the full trade count dictionary
+            total_trades=total_trades,
+            winning_trades=winning_trades,
+            losing_trades=losing_trades,
+            win_rate=round((winning_trades / (winning_trades + losing_trades) * 100), 2) if (winning_trades + losing_trades) > 0 else 0,
+            starting_day_balance=float(starting_day_balance),
+            daily_dd_limit=daily_dd_limit,
+            breaches=breaches,
+            breached=is_breached,
+            open_positions=open_positions_count,  # Add open positions count
+            consistency_score=consistency_score,
+            day_open_captured=day_open_captured,
+            polled_at=now
+        )
+    except Exception as e:
+        logging.error(f"Error processing account {account_id}: {str(e)}")
+        count("account_errors")
+        return None
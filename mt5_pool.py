@@ -0,0 +1,219 @@
+"""Pool of long-lived worker processes that each own one MT5 terminal session.
+
+The MetaTrader5 module can only drive one terminal per process, so accounts
+are fanned out over several processes. The parent keeps a queue of pending
+accounts and hands the next one to whichever worker is idle; a worker that
+doesn't answer within the per-account timeout is assumed to be stuck in the
+terminal and is killed and replaced.
+"""
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+import instrumentation
+from login_backoff import LoginBackoff
+
+# Number of worker processes polling accounts in parallel
+MT5_WORKERS = int(os.getenv("MT5_WORKERS", "4"))
+# Seconds a single account may take before its worker is restarted
+ACCOUNT_TIMEOUT = float(os.getenv("MT5_ACCOUNT_TIMEOUT", "60"))
+# Terminal installations for the workers, separated by ';' (worker N uses entry N)
+MT5_TERMINAL_PATHS = [p for p in os.getenv("MT5_TERMINAL_PATHS", "").split(";") if p]
+# Pause after shutting a terminal session down before the next login
+ACCOUNT_PAUSE = 0.5
+
+
+def _worker_main(worker_id, conn, log_queue, terminal_path):
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+    # Imported here so the broker module is only loaded inside the worker
+    from mt5_client import TerminalSession, fetch_trading_data
+    session = TerminalSession(terminal_path)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        account, starting_day_balances, aggregate, last_sample = task
+        timer = instrumentation.begin()
+        data = None
+        try:
+            if session.login(account):
+                data = fetch_trading_data(
+                    account.account_id,
+                    account.contestant_name,
+                    starting_day_balances,
+                    aggregate,
+                    last_sample
+                )
+            session.release()
+        except Exception as e:
+            logging.error(f"Worker {worker_id} failed on account {account.account_id}: {str(e)}")
+            session.reset()
+        conn.send((str(account.account_id), data, aggregate, timer.snapshot()))
+        if not session.initialized:
+            time.sleep(ACCOUNT_PAUSE)
+
+    if session.initialized:
+        session.reset()
+
+
+class _Worker:
+    def __init__(self, worker_id, process, conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.task = None
+        self.deadline = None
+
+
+class MT5WorkerPool:
+    def __init__(self, workers=None, account_timeout=None, terminal_paths=None):
+        self.size = max(1, workers if workers is not None else MT5_WORKERS)
+        self.account_timeout = account_timeout if account_timeout is not None else ACCOUNT_TIMEOUT
+        self.terminal_paths = terminal_paths if terminal_paths is not None else MT5_TERMINAL_PATHS
+        # Spawned rather than forked so no terminal state leaks from the parent
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.log_queue = None
+        self.log_listener = None
+        self.restarts = 0
+        self.login_backoff = LoginBackoff()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        self.log_queue = self.ctx.Queue()
+        self.log_listener = logging.handlers.QueueListener(
+            self.log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        self.log_listener.start()
+        self.workers = [self._spawn(worker_id) for worker_id in range(self.size)]
+        logging.info(f"Started {self.size} MT5 worker processes")
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+        self.workers = []
+        if self.log_listener:
+            self.log_listener.stop()
+            self.log_listener = None
+
+    def _spawn(self, worker_id):
+        parent_conn, child_conn = self.ctx.Pipe()
+        terminal_path = self.terminal_paths[worker_id] if worker_id < len(self.terminal_paths) else None
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, child_conn, self.log_queue, terminal_path),
+            name=f"mt5-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(worker_id, process, parent_conn)
+
+    def _restart(self, worker):
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+        self.restarts += 1
+        instrumentation.count("worker_restarts")
+        replacement = self._spawn(worker.worker_id)
+        self.workers[self.workers.index(worker)] = replacement
+        return replacement
+
+    def _record_login(self, account, timings):
+        self.login_backoff.record(account, timings["counts"].get("failed_logins", 0) > 0)
+        if "connect" in timings["phases"]:
+            instrumentation.metrics.observe_login(account.server, timings["phases"]["connect"])
+
+    def fetch_all(self, tasks):
+        """Poll every (account, starting_day_balances, aggregate, last_sample) task across the workers.
+
+        Returns (account_id, data, aggregate, timings snapshot) tuples for
+        the accounts that answered; data is None when the account couldn't be
+        read. Accounts whose worker timed out or died are left out.
+        """
+        return list(self.iter_results(tasks))
+
+    def iter_results(self, tasks):
+        """Like fetch_all, but yields each result as soon as its worker answers.
+
+        Workers are only handed new accounts while the caller keeps pulling,
+        so a consumer that falls behind holds the polling back. If the caller
+        stops early, workers still busy with an account are replaced so their
+        late answers can't be mistaken for the next task's.
+        """
+        pending = deque(tasks)
+        busy = {}
+
+        try:
+            while pending or busy:
+                for worker in self.workers:
+                    if worker.task is None and pending:
+                        worker.task = pending.popleft()
+                        worker.deadline = time.monotonic() + self.account_timeout
+                        try:
+                            worker.conn.send(worker.task)
+                        except (OSError, ValueError):
+                            # Worker died between tasks; replace it and retry the account
+                            pending.appendleft(worker.task)
+                            worker.task = None
+                            self._restart(worker)
+                            continue
+                        busy[worker.conn] = worker
+
+                if not busy:
+                    continue
+
+                timeout = max(0, min(w.deadline for w in busy.values()) - time.monotonic())
+                for conn in wait(list(busy), timeout=timeout):
+                    worker = busy.pop(conn)
+                    account = worker.task[0]
+                    worker.task = None
+                    try:
+                        result = conn.recv()
+                    except (EOFError, OSError):
+                        logging.error(f"MT5 worker {worker.worker_id} died while polling account {account.account_id}, restarting")
+                        self._restart(worker)
+                        continue
+                    self._record_login(account, result[3])
+                    yield result
+
+                now = time.monotonic()
+                for conn, worker in list(busy.items()):
+                    # An answer that arrived while the caller held us up isn't a timeout
+                    if worker.deadline <= now and not conn.poll():
+                        busy.pop(conn)
+                        account_id = str(worker.task[0].account_id)
+                        logging.error(f"Account {account_id} timed out after {self.account_timeout}s on MT5 worker {worker.worker_id}, restarting worker")
+                        instrumentation.count("account_timeouts")
+                        worker.task = None
+                        self._restart(worker)
+        finally:
+            for worker in list(busy.values()):
+                worker.task = None
+                self._restart(worker)
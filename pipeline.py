@@ -0,0 +1,134 @@
+"""Asyncio pipeline that writes polling results while later accounts are still being fetched.
+
+The broker side is a blocking iterator of results (MT5WorkerPool.iter_results)
+that a producer advances in a worker thread and pushes into a bounded queue.
+The consumer handles each result on the event loop as it arrives and groups
+them into batches that are flushed to the database in threads, at most
+DB_WRITE_CONCURRENCY at a time. A batch is flushed once it holds
+PIPELINE_FLUSH_SIZE results or its oldest result has waited
+PIPELINE_FLUSH_INTERVAL seconds. Results marked urgent are flushed on
+their own straight away.
+
+Backpressure is explicit: when every flush slot is taken the consumer stops
+draining the queue, a full queue stops the producer, and a producer that
+isn't pulling stops the worker pool from handing out new accounts.
+"""
+import asyncio
+import logging
+import os
+import time
+
+# Results buffered between the broker and the database side
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+# Results per database flush and the longest a result waits for its batch to fill
+PIPELINE_FLUSH_SIZE = int(os.getenv("PIPELINE_FLUSH_SIZE", "25"))
+PIPELINE_FLUSH_INTERVAL = float(os.getenv("PIPELINE_FLUSH_INTERVAL", "2"))
+# Database flushes allowed to run at the same time
+DB_WRITE_CONCURRENCY = int(os.getenv("DB_WRITE_CONCURRENCY", "2"))
+
+_DONE = object()
+
+
+async def _produce(results, queue):
+    iterator = iter(results)
+    error = None
+    try:
+        while True:
+            # Each next() blocks until a worker answers, so it runs off the loop
+            result = await asyncio.to_thread(next, iterator, _DONE)
+            if result is _DONE:
+                break
+            if queue.full():
+                logging.info("Pipeline queue full, holding back the broker until the database catches up")
+            await queue.put(result)
+    except Exception as e:
+        # Let the consumer flush what it has before the error surfaces
+        error = e
+    await queue.put(_DONE)
+    if error is not None:
+        raise error
+
+
+async def _consume(queue, handle, flush, flush_size, flush_interval, concurrency, urgent):
+    slots = asyncio.Semaphore(concurrency)
+    flushes = set()
+    failures = []
+
+    async def run_flush(batch):
+        try:
+            await asyncio.to_thread(flush, batch)
+        except Exception as e:
+            logging.error(f"Pipeline flush of {len(batch)} results failed: {str(e)}")
+            failures.append(e)
+        finally:
+            slots.release()
+
+    async def start_flush(batch):
+        await slots.acquire()
+        task = asyncio.create_task(run_flush(batch))
+        flushes.add(task)
+        task.add_done_callback(flushes.discard)
+
+    batch = []
+    batch_started = None
+    done = False
+    while not done:
+        timeout = None
+        if batch:
+            timeout = max(0, batch_started + flush_interval - time.monotonic())
+        try:
+            result = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            result = None
+        if result is _DONE:
+            done = True
+        elif result is not None:
+            item = handle(result)
+            if item is not None and urgent is not None and urgent(item):
+                await start_flush([item])
+            elif item is not None:
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(item)
+
+        if batch and (done or len(batch) >= flush_size or time.monotonic() - batch_started >= flush_interval):
+            await start_flush(batch)
+            batch = []
+
+    if flushes:
+        await asyncio.gather(*flushes)
+    return failures
+
+
+async def _run(results, handle, flush, queue_size, flush_size, flush_interval, concurrency, urgent):
+    queue = asyncio.Queue(maxsize=max(1, queue_size))
+    producer = asyncio.create_task(_produce(results, queue))
+    try:
+        failures = await _consume(queue, handle, flush, flush_size, flush_interval, concurrency, urgent)
+    except BaseException:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        raise
+    await producer
+    return failures
+
+
+def run_pipeline(results, handle, flush, queue_size=None, flush_size=None, flush_interval=None, concurrency=None,
+                 urgent=None):
+    """Stream results through handle() on the loop and flush() in batches from threads.
+
+    handle(result) returns the item to batch, or None to leave the result
+    out of the flushes. flush(batch) does blocking database writes. Items
+    for which urgent(item) is true skip the batching. Returns the
+    exceptions raised by failed flushes; the other batches still land.
+    """
+    return asyncio.run(_run(
+        results,
+        handle,
+        flush,
+        queue_size or PIPELINE_QUEUE_SIZE,
+        max(1, flush_size or PIPELINE_FLUSH_SIZE),
+        flush_interval if flush_interval is not None else PIPELINE_FLUSH_INTERVAL,
+        max(1, concurrency or DB_WRITE_CONCURRENCY),
+        urgent,
+    ))
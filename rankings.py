@@ -0,0 +1,155 @@
+"""Leaderboard ranks computed once per cycle and materialized in leaderboard_ranks.
+
+Frontends used to sort the whole leaderboard table on every request. The
+poller already holds every account's latest return, so it ranks them once
+per cycle and stores rank, movement since the previous cycle and since the
+trading day opened, and percentile per account. leaderboard_ranks is
+indexed on rank, so the top N, page K or the rows around one contestant
+are range scans:
+
+    SELECT * FROM leaderboard_ranks WHERE rank BETWEEN 51 AND 100 ORDER BY rank
+
+Accounts are ranked by return, then balance, then account id so that every
+rank is distinct and stable. Only rows whose values changed are rewritten.
+"""
+import logging
+from datetime import datetime
+from psycopg2.extras import execute_values
+from equity_store import trading_day_start
+
+RANK_PAGE_SIZE = 1000
+
+
+class RankingBoard:
+    def __init__(self, pool):
+        self.pool = pool
+        self.standings = {}      # account_id -> (return, balance, contestant_name, breached)
+        self.ranks = {}          # account_id -> rank from the latest computation
+        self.day_open_ranks = {} # account_id -> rank when the current trading day opened
+        self.trading_day = None
+        self.written = {}        # account_id -> row last written to leaderboard_ranks
+        self.rows = {}           # rows of the latest computation
+
+    def load(self):
+        """Seed standings from the leaderboard and ranks from the previous run"""
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT account_id, return, balance, contestant_name, breached FROM leaderboard")
+                for account_id, return_pct, balance, contestant_name, breached in cur.fetchall():
+                    self.standings[str(account_id)] = (
+                        float(return_pct or 0), float(balance or 0), contestant_name, bool(breached)
+                    )
+                cur.execute("SELECT account_id, rank, day_open_rank, trading_day FROM leaderboard_ranks")
+                for account_id, rank, day_open_rank, trading_day in cur.fetchall():
+                    self.ranks[str(account_id)] = rank
+                    # Unknown contents; rewritten on the first write, or deleted if the account is gone
+                    self.written[str(account_id)] = None
+                    if day_open_rank is not None:
+                        self.day_open_ranks[str(account_id)] = day_open_rank
+                    if trading_day is not None:
+                        self.trading_day = max(self.trading_day or trading_day, trading_day)
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+        logging.info(f"Ranking board loaded {len(self.standings)} accounts and {len(self.ranks)} previous ranks")
+
+    def update(self, account_data_list):
+        for data in account_data_list:
+            self.set_standing(data.account_id, data.return_pct, data.balance, data.contestant_name, data.breached)
+
+    def set_standing(self, account_id, return_pct, balance, contestant_name, breached):
+        self.standings[str(account_id)] = (float(return_pct or 0), float(balance or 0), contestant_name, bool(breached))
+
+    def retain(self, account_ids):
+        """Forget accounts that are no longer on the leaderboard"""
+        account_ids = {str(account_id) for account_id in account_ids}
+        for account_id in set(self.standings) - account_ids:
+            del self.standings[account_id]
+
+    def compute(self, now=None):
+        """Rank every account, returns the leaderboard_ranks rows keyed by account id"""
+        now = now or datetime.now()
+        trading_day = trading_day_start(now)
+        if trading_day != self.trading_day:
+            # Movement today is measured against the ranks the day closed with
+            self.day_open_ranks = dict(self.ranks)
+            self.trading_day = trading_day
+
+        ordered = sorted(
+            self.standings.items(),
+            key=lambda item: (-item[1][0], -item[1][1], item[0])
+        )
+        total = len(ordered)
+        previous = self.ranks
+        self.ranks = {}
+        rows = {}
+        for rank, (account_id, (return_pct, balance, contestant_name, breached)) in enumerate(ordered, start=1):
+            self.ranks[account_id] = rank
+            previous_rank = previous.get(account_id)
+            day_open_rank = self.day_open_ranks.get(account_id)
+            rows[account_id] = (
+                account_id,
+                contestant_name,
+                rank,
+                previous_rank,
+                previous_rank - rank if previous_rank is not None else 0,
+                day_open_rank,
+                day_open_rank - rank if day_open_rank is not None else 0,
+                round(100.0 * (total - rank) / (total - 1), 2) if total > 1 else 100.0,
+                return_pct,
+                balance,
+                breached,
+                self.trading_day,
+            )
+        self.rows = rows
+        return rows
+
+    def write(self, rows):
+        """Upsert the rows that changed and drop accounts that left, returns rows written"""
+        changed = [row for account_id, row in rows.items() if self.written.get(account_id) != row]
+        removed = [account_id for account_id in self.written if account_id not in rows]
+        if not changed and not removed:
+            return 0
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                if changed:
+                    execute_values(cur, """
+                        INSERT INTO leaderboard_ranks (
+                            account_id, contestant_name, rank, previous_rank, rank_change,
+                            day_open_rank, rank_change_today, percentile, return, balance,
+                            breached, trading_day
+                        ) VALUES %s
+                        ON CONFLICT (account_id) DO UPDATE SET
+                            contestant_name = EXCLUDED.contestant_name,
+                            rank = EXCLUDED.rank,
+                            previous_rank = EXCLUDED.previous_rank,
+                            rank_change = EXCLUDED.rank_change,
+                            day_open_rank = EXCLUDED.day_open_rank,
+                            rank_change_today = EXCLUDED.rank_change_today,
+                            percentile = EXCLUDED.percentile,
+                            return = EXCLUDED.return,
+                            balance = EXCLUDED.balance,
+                            breached = EXCLUDED.breached,
+                            trading_day = EXCLUDED.trading_day,
+                            updated_at = NOW()
+                    """, changed, template="(%s::numeric, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                        page_size=RANK_PAGE_SIZE)
+                if removed:
+                    cur.execute(
+                        "DELETE FROM leaderboard_ranks WHERE account_id = ANY(%s::numeric[])",
+                        (removed,)
+                    )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+        for row in changed:
+            self.written[row[0]] = row
+        for account_id in removed:
+            del self.written[account_id]
+        logging.info(f"Rankings: {len(changed)} ranks written, {len(removed)} removed, {len(rows) - len(changed)} unchanged")
+        return len(changed)
@@ -0,0 +1,237 @@
+"""Read-only HTTP API serving the latest cycle's leaderboard from memory.
+
+After every cycle the poller publishes a LeaderboardSnapshot built from the
+ranks, the latest result of every account and the metadata. Requests are
+answered from that snapshot without touching the database:
+
+    GET /leaderboard?page=1&per_page=50   ranked rows, paginated
+    GET /accounts/<account_id>            one account's latest result and rank
+    GET /metadata                         most traded symbols
+
+Every row is serialized to JSON once per snapshot and pages are assembled
+from those bytes and cached. Responses carry an ETag derived from the body,
+so a client revalidating with If-None-Match gets a 304 until the content
+actually changes, even across cycles. READ_API_PORT (0 disables) and
+READ_API_HOST choose where it listens.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from json_encoding import json_default
+
+READ_API_PORT = int(os.getenv("READ_API_PORT", "8000"))
+READ_API_HOST = os.getenv("READ_API_HOST", "127.0.0.1")
+# Seconds clients and proxies may reuse a response without revalidating
+READ_API_MAX_AGE = int(os.getenv("READ_API_MAX_AGE", "30"))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Result fields that are the poller's own bookkeeping rather than account data
+_INTERNAL_FIELDS = {"day_open_captured", "polled_at"}
+# Leaderboard columns that seed the details of accounts this process doesn't poll
+DETAIL_COLUMNS = (
+    "contestant_name", "balance", "equity", "profit_loss", "return", "lots_traded", "average_lots",
+    "most_traded_symbol", "symbol_trade_counts", "total_trades", "winning_trades", "losing_trades",
+    "win_rate", "starting_day_balance", "daily_dd_limit", "breaches", "breached", "open_positions",
+    "consistency_score",
+)
+
+
+def _dumps(value):
+    return json.dumps(value, default=json_default, separators=(",", ":")).encode()
+
+
+def _etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class LeaderboardSnapshot:
+    """Immutable view of one cycle, with its JSON pre-serialized"""
+
+    def __init__(self, rank_rows, details, most_traded):
+        ranked = sorted(rank_rows.values(), key=lambda row: row[2])
+        self.total = len(ranked)
+        self.rows = []
+        self.accounts = {}
+        for (account_id, contestant_name, rank, previous_rank, rank_change, day_open_rank,
+             rank_change_today, percentile, return_pct, balance, breached, trading_day) in ranked:
+            ranking = {
+                "rank": rank,
+                "previous_rank": previous_rank,
+                "rank_change": rank_change,
+                "day_open_rank": day_open_rank,
+                "rank_change_today": rank_change_today,
+                "percentile": percentile,
+            }
+            detail = details.get(account_id, {})
+            row = {
+                "account_id": account_id,
+                "contestant_name": contestant_name,
+                **ranking,
+                "return": return_pct,
+                "balance": balance,
+                "equity": detail.get("equity"),
+                "profit_loss": detail.get("profit_loss"),
+                "win_rate": detail.get("win_rate"),
+                "total_trades": detail.get("total_trades"),
+                "open_positions": detail.get("open_positions"),
+                "breached": breached,
+                "updated_at": detail.get("polled_at"),
+            }
+            self.rows.append(_dumps(row))
+
+            account = {k: v for k, v in detail.items() if k not in _INTERNAL_FIELDS}
+            account.update({
+                "account_id": account_id,
+                "contestant_name": contestant_name,
+                "breached": breached,
+                "ranking": ranking,
+                "updated_at": detail.get("polled_at"),
+            })
+            body = _dumps(account)
+            self.accounts[account_id] = (body, _etag(body))
+
+        body = _dumps({"most_traded": most_traded or {}})
+        self.metadata = (body, _etag(body))
+        self.pages = {}
+
+    def page(self, page, per_page):
+        """(body, etag) of one leaderboard page, assembled on first use; None past the last page"""
+        if page > max(1, (self.total + per_page - 1) // per_page):
+            return None
+        key = (page, per_page)
+        cached = self.pages.get(key)
+        if cached is None:
+            start = (page - 1) * per_page
+            items = self.rows[start:start + per_page]
+            header = _dumps({
+                "page": page,
+                "per_page": per_page,
+                "total": self.total,
+                "pages": (self.total + per_page - 1) // per_page,
+            })
+            # Splice the pre-serialized rows into the page object
+            body = header[:-1] + b',"items":[' + b",".join(items) + b"]}"
+            cached = self.pages[key] = (body, _etag(body))
+        return cached
+
+
+class SnapshotPublisher:
+    """Keeps every account's latest result and swaps in a new snapshot per cycle"""
+
+    def __init__(self):
+        self.details = {}
+        self.lock = threading.Lock()  # seed() runs from the database startup thread too
+        self.snapshot = LeaderboardSnapshot({}, {}, None)
+
+    def seed(self, rows):
+        """Take details from leaderboard rows (dicts with DETAIL_COLUMNS, account_id and last_update_time).
+
+        Breached accounts and, on a sharded node, other nodes' accounts are
+        never polled here; their rows are all there is. A row only replaces
+        details that are older than it.
+        """
+        with self.lock:
+            for row in rows:
+                account_id = str(row["account_id"])
+                polled_at = row["last_update_time"]
+                current = self.details.get(account_id)
+                if current is not None and (polled_at is None or current["polled_at"] is not None and current["polled_at"] >= polled_at):
+                    continue
+                detail = {column: row[column] for column in DETAIL_COLUMNS}
+                detail.update(account_id=account_id, polled_at=polled_at)
+                # Stored as strings in the jsonb column; polled results carry ints
+                detail["symbol_trade_counts"] = {symbol: int(n) for symbol, n in (detail["symbol_trade_counts"] or {}).items()}
+                self.details[account_id] = detail
+
+    def publish(self, rank_rows, account_data_list, most_traded):
+        started = time.perf_counter()
+        with self.lock:
+            for data in account_data_list:
+                self.details[str(data.account_id)] = data.to_dict()
+            for account_id in set(self.details) - set(rank_rows):
+                del self.details[account_id]
+            # Readers keep using the old snapshot until this single assignment
+            self.snapshot = LeaderboardSnapshot(rank_rows, self.details, most_traded)
+        logging.info(f"Published leaderboard snapshot of {self.snapshot.total} accounts in {time.perf_counter() - started:.3f}s")
+
+
+publisher = SnapshotPublisher()
+
+
+class _ReadHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        snapshot = publisher.snapshot
+        if url.path == "/leaderboard":
+            query = parse_qs(url.query)
+            try:
+                page = int(query.get("page", ["1"])[0])
+                per_page = int(query.get("per_page", [str(DEFAULT_PAGE_SIZE)])[0])
+            except ValueError:
+                self._send_error(400, "page and per_page must be integers")
+                return
+            if page < 1 or not 1 <= per_page <= MAX_PAGE_SIZE:
+                self._send_error(400, f"page must be >= 1 and per_page between 1 and {MAX_PAGE_SIZE}")
+                return
+            found = snapshot.page(page, per_page)
+            if found is None:
+                self._send_error(404, "page out of range")
+                return
+            body, etag = found
+        elif url.path.startswith("/accounts/"):
+            found = snapshot.accounts.get(url.path[len("/accounts/"):])
+            if found is None:
+                self._send_error(404, "unknown account")
+                return
+            body, etag = found
+        elif url.path == "/metadata":
+            body, etag = snapshot.metadata
+        else:
+            self._send_error(404, "not found")
+            return
+
+        if etag in (tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"public, max-age={READ_API_MAX_AGE}")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", f"public, max-age={READ_API_MAX_AGE}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        body = _dumps({"error": message})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_read_api(port=None, host=None):
+    """Serve the read API from a daemon thread, returns the server or None when disabled"""
+    port = READ_API_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host or READ_API_HOST, port), _ReadHandler)
+    except OSError as e:
+        logging.error(f"Could not start read API on port {port}: {str(e)}")
+        return None
+    threading.Thread(target=server.serve_forever, name="read-api-http", daemon=True).start()
+    logging.info(f"Serving the leaderboard read API on http://{host or READ_API_HOST}:{port}/leaderboard")
+    return server
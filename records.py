@@ -0,0 +1,76 @@
+"""Slotted records for the state the poller keeps per account.
+
+Accounts in the registry and the per-poll results are held for every
+contestant for the life of the process and pickled between the poller and
+the MT5 workers on every poll, so they are plain classes with __slots__
+instead of dicts: no per-instance __dict__, and field names are checked.
+Symbol names are interned so the same string object is shared by every
+account's symbol counts instead of one copy per account and poll.
+"""
+import sys
+
+
+def intern_symbol(symbol):
+    return sys.intern(symbol) if isinstance(symbol, str) else symbol
+
+
+def intern_counts(counts):
+    """Symbol -> count mapping with interned symbol names and int counts"""
+    return {intern_symbol(symbol): int(n) for symbol, n in counts.items()}
+
+
+class _Record:
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    # Pickled as a bare tuple of values on the way to and from the workers
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name, None)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Account(_Record):
+    """A contestant's credentials and leaderboard state, as the registry knows it"""
+    __slots__ = ("account_id", "server", "password", "contestant_name", "breached", "starting_day_balance")
+
+
+class AccountResult(_Record):
+    """What one poll of an account produced"""
+    __slots__ = (
+        "account_id", "contestant_name", "balance", "equity", "profit_loss", "return_pct",
+        "lots_traded", "average_lots", "most_traded_symbol", "symbol_trade_counts",
+        "total_trades", "winning_trades", "losing_trades", "win_rate",
+        "starting_day_balance", "daily_dd_limit", "breaches", "breached",
+        "open_positions", "consistency_score", "day_open_captured", "polled_at",
+    )
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Symbol names arrive from the worker as fresh copies; share the parent's
+        self.symbol_trade_counts = intern_counts(self.symbol_trade_counts)
+        self.most_traded_symbol = intern_symbol(self.most_traded_symbol)
+
+    def to_dict(self):
+        """The result with the leaderboard's field names (return rather than return_pct)"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields["return"] = fields.pop("return_pct")
+        return fields
+
+    @classmethod
+    def from_dict(cls, fields):
+        """Inverse of to_dict"""
+        fields = dict(fields)
+        fields["return_pct"] = fields.pop("return")
+        return cls(**fields)
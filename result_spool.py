@@ -0,0 +1,171 @@
+"""Local write-ahead spool for leaderboard writes.
+
+Every batch of poll results is appended to RESULT_SPOOL_PATH (one JSON line
+per result, fsynced) before it is written to the leaderboard, and the write
+drains the whole spool rather than just the batch. While the database is
+unreachable the results pile up in the spool instead of being dropped with
+the failed write; the first write that succeeds afterwards replays them in
+bulk. Only the latest result per account is kept for the replay, so an
+outage costs one row per account however long it lasts.
+
+On startup the file is read back, so results spooled before a crash or
+restart are written too. The file is truncated whenever everything in it
+has been written, and rewritten with just the pending results once it
+grows past SPOOL_COMPACT_BYTES.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+import instrumentation
+from json_encoding import json_default
+from records import AccountResult
+
+RESULT_SPOOL_PATH = os.getenv("RESULT_SPOOL_PATH", "result_spool.jsonl")
+# fsync every append; turning it off trades durability across power loss for latency
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "1") == "1"
+SPOOL_COMPACT_BYTES = int(os.getenv("SPOOL_COMPACT_BYTES", str(16 * 2 ** 20)))
+
+
+def _encode(data):
+    return json.dumps(data.to_dict(), default=json_default, separators=(",", ":")) + "\n"
+
+
+def _decode(line):
+    fields = json.loads(line)
+    fields["polled_at"] = datetime.fromisoformat(fields["polled_at"])
+    return AccountResult.from_dict(fields)
+
+
+class ResultSpool:
+    def __init__(self, path=None, fsync=None, compact_bytes=None):
+        self.path = RESULT_SPOOL_PATH if path is None else path
+        self.fsync = SPOOL_FSYNC if fsync is None else fsync
+        self.compact_bytes = SPOOL_COMPACT_BYTES if compact_bytes is None else compact_bytes
+        self.pending = {}       # account_id -> latest result not yet written
+        self.in_flight = {}     # account_id -> result a drain is writing right now
+        self.lock = threading.Lock()
+        self.file = None
+        self.backlog = False  # a drain failed and its results haven't been written yet
+
+    @property
+    def depth(self):
+        return len(self.pending) + len(self.in_flight)
+
+    def open(self):
+        """Read back whatever an earlier run left unwritten and open the file for appending"""
+        replayed = 0
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        data = _decode(line)
+                    except (ValueError, KeyError, TypeError):
+                        # A line torn by a crash mid-append
+                        continue
+                    self._coalesce(data)
+                    replayed += 1
+        self.file = open(self.path, "a")
+        if replayed:
+            logging.info(f"Result spool holds {len(self.pending)} accounts ({replayed} spooled results) from an earlier run")
+        self._report()
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _coalesce(self, data):
+        account_id = str(data.account_id)
+        previous = self.pending.get(account_id)
+        if previous is None or previous.polled_at <= data.polled_at:
+            self.pending[account_id] = data
+
+    def append(self, account_data_list):
+        """Durably record results before they are written"""
+        if not account_data_list:
+            return
+        with self.lock:
+            self.file.write("".join(_encode(data) for data in account_data_list))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            for data in account_data_list:
+                self._coalesce(data)
+        instrumentation.metrics.inc("spool_appended", len(account_data_list))
+        self._report()
+
+    def drain(self, write, owns=None):
+        """Hand every pending result to write() in one call, returns how many were written.
+
+        write must raise when the results didn't make it to the database;
+        they then stay spooled for the next drain. With owns, results of
+        accounts it rejects (shards another node took over meanwhile) are
+        dropped instead of written over that node's newer ones.
+        """
+        with self.lock:
+            if owns is not None:
+                unowned = [account_id for account_id in self.pending if not owns(account_id)]
+                for account_id in unowned:
+                    del self.pending[account_id]
+                if unowned:
+                    instrumentation.metrics.inc("spool_dropped_unowned", len(unowned))
+                    logging.info(f"Result spool dropped {len(unowned)} accounts this node no longer owns")
+            # An account another drain is still writing waits for the next one
+            batch = {account_id: data for account_id, data in self.pending.items() if account_id not in self.in_flight}
+            if not batch:
+                return 0
+            for account_id in batch:
+                del self.pending[account_id]
+            self.in_flight.update(batch)
+
+        started = time.monotonic()
+        try:
+            write(list(batch.values()))
+        except Exception as e:
+            with self.lock:
+                for account_id in batch:
+                    del self.in_flight[account_id]
+                for data in batch.values():
+                    self._coalesce(data)
+            self.backlog = True
+            instrumentation.metrics.inc("spool_drain_failures")
+            logging.error(f"Result spool drain failed, {self.depth} accounts stay spooled: {str(e)}")
+            self._report()
+            return 0
+
+        elapsed = time.monotonic() - started
+        with self.lock:
+            for account_id in batch:
+                del self.in_flight[account_id]
+            if not self.pending and not self.in_flight:
+                self.file.seek(0)
+                self.file.truncate()
+            elif self.file.tell() > self.compact_bytes:
+                self._compact()
+        instrumentation.metrics.inc("spool_drained", len(batch))
+        instrumentation.metrics.set_gauge("spool_drain_rows_per_second", round(len(batch) / elapsed, 1) if elapsed > 0 else 0)
+        if self.backlog and not self.depth:
+            self.backlog = False
+            logging.info(f"Result spool caught up, last drain wrote {len(batch)} accounts in {elapsed:.3f}s")
+        self._report()
+        return len(batch)
+
+    def _compact(self):
+        # Caller holds the lock; results being written right now stay in the file too
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(_encode(data) for data in [*self.in_flight.values(), *self.pending.values()]))
+            f.flush()
+            os.fsync(f.fileno())
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a")
+
+    def _report(self):
+        instrumentation.metrics.set_gauge("spool_depth", self.depth)
+        if self.file is not None:
+            instrumentation.metrics.set_gauge("spool_bytes", self.file.tell())
@@ -0,0 +1,150 @@
+"""Risk-based polling schedule for contestant accounts.
+
+The poller wakes up every TICK_SECONDS and asks the scheduler which accounts
+to poll. Each account gets a refresh interval from its last result: accounts
+close to the daily or max drawdown limit are polled every tick, accounts with
+open positions or recent trading at the normal 5-minute cadence and idle
+accounts less often. Accounts not yet seen since the day rollover come
+first, then due accounts most urgent first until the estimated work fills
+the tick's time budget; the rest wait for the next tick and are reported as
+missed deadlines once they are more than a tick late.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+
+from competition import INITIAL_BALANCE, MAX_DRAWDOWN
+from equity_store import trading_day_start
+from instrumentation import count
+
+TICK_SECONDS = int(os.getenv("SCHEDULER_TICK_SECONDS", "60"))
+# Share of a tick that polling may fill, leaving room for the database writes
+TICK_BUDGET_FRACTION = 0.8
+
+NEAR_BREACH_INTERVAL = 60
+AT_RISK_INTERVAL = 120
+ACTIVE_INTERVAL = 300
+DORMANT_INTERVAL = 900
+
+# Headroom above the nearest drawdown limit, in percent of the initial balance
+NEAR_BREACH_MARGIN = 1.0
+AT_RISK_MARGIN = 3.0
+# Consecutive polls without any change before an account counts as dormant
+DORMANT_AFTER_POLLS = 3
+# Assumed seconds per account until one has actually been polled
+DEFAULT_POLL_COST = 5.0
+
+
+class AccountSchedule:
+    __slots__ = ("account_id", "interval", "next_due", "last_polled", "cost", "idle_polls",
+                 "fingerprint", "missed_reported")
+
+    def __init__(self, account_id, now):
+        self.account_id = account_id
+        self.interval = NEAR_BREACH_INTERVAL
+        self.next_due = now
+        self.last_polled = None
+        self.cost = DEFAULT_POLL_COST
+        self.idle_polls = 0
+        self.fingerprint = None
+        self.missed_reported = False
+
+
+class PollScheduler:
+    def __init__(self, workers, tick_seconds=None):
+        self.workers = max(1, workers)
+        self.tick_seconds = tick_seconds or TICK_SECONDS
+        self.accounts = {}
+        self.missed_deadlines = 0
+        self.tick_started = None
+
+    def sync(self, account_ids, now=None):
+        """Track exactly these accounts; new ones are due immediately"""
+        now = now if now is not None else time.time()
+        account_ids = set(account_ids)
+        for account_id in account_ids - set(self.accounts):
+            self.accounts[account_id] = AccountSchedule(account_id, now)
+        for account_id in set(self.accounts) - account_ids:
+            del self.accounts[account_id]
+
+    def _day_open_due(self, schedule, now):
+        # The first poll after the rollover sets the day-open balance, so get
+        # everyone seen soon after it rather than at their usual cadence
+        rollover = trading_day_start(datetime.fromtimestamp(now)).timestamp()
+        return schedule.last_polled is not None and schedule.last_polled < rollover
+
+    def select(self, now=None):
+        """Account ids to poll this tick, most urgent first, within the time budget"""
+        now = now if now is not None else time.time()
+        self.tick_started = now
+        due = [
+            s for s in self.accounts.values()
+            if s.next_due <= now or self._day_open_due(s, now)
+        ]
+        due.sort(key=lambda s: (not self._day_open_due(s, now), s.interval, s.next_due))
+
+        budget = self.tick_seconds * TICK_BUDGET_FRACTION * self.workers
+        selected = []
+        spent = 0.0
+        for schedule in due:
+            if selected and spent + schedule.cost > budget:
+                break
+            selected.append(schedule.account_id)
+            spent += schedule.cost
+
+        missed = []
+        for schedule in due[len(selected):]:
+            if now - schedule.next_due > self.tick_seconds and not schedule.missed_reported:
+                schedule.missed_reported = True
+                missed.append(schedule.account_id)
+        if missed:
+            self.missed_deadlines += len(missed)
+            count("missed_deadlines", len(missed))
+            logging.warning(f"Scheduler missed polling deadlines for {len(missed)} accounts: {', '.join(missed[:10])}")
+        if len(selected) < len(due):
+            logging.info(f"Scheduler deferred {len(due) - len(selected)} due accounts to the next tick")
+        return selected
+
+    def update(self, account_id, data, cost=None, now=None):
+        """Reschedule an account from its latest poll result (data None if the poll failed)"""
+        schedule = self.accounts.get(account_id)
+        if schedule is None:
+            return
+        # Intervals count from the start of the tick so polls stay on tick boundaries
+        now = now if now is not None else (self.tick_started or time.time())
+        schedule.last_polled = now
+        schedule.missed_reported = False
+        if cost is not None:
+            # Smooth the cost estimate so one slow login doesn't starve the next tick
+            schedule.cost = 0.7 * schedule.cost + 0.3 * cost
+
+        if data is None:
+            # Couldn't read the account; retry at the normal cadence
+            schedule.interval = ACTIVE_INTERVAL
+        else:
+            fingerprint = (data.equity, data.balance, data.total_trades, data.open_positions)
+            schedule.idle_polls = schedule.idle_polls + 1 if fingerprint == schedule.fingerprint else 0
+            schedule.fingerprint = fingerprint
+            schedule.interval = self.interval_for(data, schedule.idle_polls)
+        schedule.next_due = now + schedule.interval
+
+    @staticmethod
+    def interval_for(data, idle_polls=0):
+        equity = data.equity
+        daily_headroom = equity - data.daily_dd_limit
+        max_headroom = equity - INITIAL_BALANCE * MAX_DRAWDOWN
+        headroom_pct = min(daily_headroom, max_headroom) / INITIAL_BALANCE * 100
+
+        if headroom_pct <= NEAR_BREACH_MARGIN:
+            return NEAR_BREACH_INTERVAL
+        if headroom_pct <= AT_RISK_MARGIN and data.open_positions:
+            return AT_RISK_INTERVAL
+        if data.open_positions or idle_polls < DORMANT_AFTER_POLLS:
+            return ACTIVE_INTERVAL
+        return DORMANT_INTERVAL
+
+    def next_wakeup(self, now=None):
+        """Seconds until the next tick boundary"""
+        now = now if now is not None else time.time()
+        return self.tick_seconds - (now % self.tick_seconds)
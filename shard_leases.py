@@ -0,0 +1,216 @@
+"""Lease-based ownership of account shards across poller nodes.
+
+Accounts are split into SHARD_COUNT shards by a stable hash of the account
+id. Every shard has one row in shard_leases naming the node that owns it and
+when that lease runs out. At the start of each cycle a node heartbeats in
+poller_nodes and rebalances in one transaction: it renews its own leases,
+works out its fair share (shards / live nodes, rounded up), hands back what
+it holds above that and claims free or expired shards up to it. A node that
+dies stops renewing, so its shards become claimable after SHARD_LEASE_TTL
+and the survivors pick them up on their next cycle; a node that joins gets
+the shards the others shed.
+
+Between cycles a background thread keeps the leases alive without moving
+any, so a long cycle doesn't lose its shards halfway. Each node only polls
+and writes the accounts of the shards it owns. The node holding shard 0 is
+the leader and also does the competition-wide writes (ranks, metadata,
+equity compaction).
+
+When the database can't be reached the node keeps the shards it holds until
+their leases would have run out, measured on its own clock from the last
+successful renewal; after that it owns nothing until it rebalances again,
+since the other nodes may have claimed them by then.
+"""
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import zlib
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "64"))
+# Seconds a lease (and a node's heartbeat) stays valid without being renewed
+LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", "60"))
+# Nodes silent for this many TTLs are removed from poller_nodes
+NODE_EXPIRY_TTLS = 10
+
+
+def default_node_id():
+    return os.getenv("POLLER_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def shard_of(account_id, shard_count=None):
+    return zlib.crc32(str(account_id).encode()) % (shard_count or SHARD_COUNT)
+
+
+class ShardLeases:
+    def __init__(self, pool, node_id=None, shard_count=None, lease_ttl=None):
+        self.pool = pool
+        self.node_id = node_id or default_node_id()
+        self.shard_count = shard_count or SHARD_COUNT
+        self.lease_ttl = LEASE_TTL if lease_ttl is None else lease_ttl
+        self.owned = frozenset()
+        self.valid_until = 0  # monotonic time the held leases run out unless renewed
+        self.live_nodes = 0
+        self.peer_watermark = None  # last_update_time up to which other nodes' rows were read
+        self._lock = threading.Lock()  # the heartbeat thread mustn't interleave with a rebalance
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def valid(self):
+        return time.monotonic() < self.valid_until
+
+    def owns(self, account_id):
+        return self.valid and shard_of(account_id, self.shard_count) in self.owned
+
+    @property
+    def leader(self):
+        return self.valid and 0 in self.owned
+
+    def rebalance(self):
+        """Heartbeat, renew and move leases towards a fair share, returns (gained, lost) shards"""
+        with self._lock:
+            return self._rebalance()
+
+    def _rebalance(self):
+        # Leases are extended relative to the database's clock; counting from
+        # before the statement keeps the local deadline on the safe side
+        started = time.monotonic()
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO poller_nodes (node_id, heartbeat_at) VALUES (%s, NOW())
+                    ON CONFLICT (node_id) DO UPDATE SET heartbeat_at = NOW()
+                """, (self.node_id,))
+                cur.execute(
+                    "DELETE FROM poller_nodes WHERE heartbeat_at < NOW() - %s * interval '1 second'",
+                    (self.lease_ttl * NODE_EXPIRY_TTLS,)
+                )
+                cur.execute("""
+                    INSERT INTO shard_leases (shard)
+                    SELECT generate_series(0, %s - 1)
+                    ON CONFLICT (shard) DO NOTHING
+                """, (self.shard_count,))
+                cur.execute(
+                    "SELECT count(*) FROM poller_nodes WHERE heartbeat_at >= NOW() - %s * interval '1 second'",
+                    (self.lease_ttl,)
+                )
+                self.live_nodes = max(1, cur.fetchone()[0])
+                target = math.ceil(self.shard_count / self.live_nodes)
+
+                cur.execute("""
+                    UPDATE shard_leases SET expires_at = NOW() + %s * interval '1 second'
+                    WHERE node_id = %s AND shard < %s
+                    RETURNING shard
+                """, (self.lease_ttl, self.node_id, self.shard_count))
+                owned = sorted(row[0] for row in cur.fetchall())
+                if len(owned) > target:
+                    # Hand back the highest shards so shard 0 (leadership) stays put
+                    excess = owned[target:]
+                    cur.execute(
+                        "UPDATE shard_leases SET node_id = NULL, expires_at = NULL WHERE shard = ANY(%s) AND node_id = %s",
+                        (excess, self.node_id)
+                    )
+                    owned = owned[:target]
+                elif len(owned) < target:
+                    cur.execute("""
+                        UPDATE shard_leases SET node_id = %s, expires_at = NOW() + %s * interval '1 second'
+                        WHERE shard IN (
+                            SELECT shard FROM shard_leases
+                            WHERE shard < %s AND (node_id IS NULL OR expires_at < NOW())
+                            ORDER BY shard
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING shard
+                    """, (self.node_id, self.lease_ttl, self.shard_count, target - len(owned)))
+                    owned += [row[0] for row in cur.fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+        owned = frozenset(owned)
+        # Shards held past their expiry may have been polled by another node meanwhile
+        previous = self.owned if self.valid else frozenset()
+        gained, lost = owned - previous, previous - owned
+        self.owned = owned
+        self.valid_until = started + self.lease_ttl
+        if gained or lost:
+            logging.info(
+                f"Node {self.node_id} owns {len(owned)}/{self.shard_count} shards of {self.live_nodes} live nodes "
+                f"({len(gained)} gained, {len(lost)} lost){', leader' if self.leader else ''}"
+            )
+        return gained, lost
+
+    def renew(self):
+        """Extend the leases still held without claiming or releasing any"""
+        with self._lock:
+            self._renew()
+
+    def _renew(self):
+        started = time.monotonic()
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE poller_nodes SET heartbeat_at = NOW() WHERE node_id = %s", (self.node_id,))
+                cur.execute("""
+                    UPDATE shard_leases SET expires_at = NOW() + %s * interval '1 second'
+                    WHERE node_id = %s
+                    RETURNING shard
+                """, (self.lease_ttl, self.node_id))
+                renewed = frozenset(row[0] for row in cur.fetchall())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+        lost = self.owned - renewed
+        if lost:
+            # Expired and taken over while this node was stalled
+            logging.warning(f"Node {self.node_id} lost {len(lost)} shards to other nodes")
+            self.owned = self.owned - lost
+        if self.valid:
+            # Past the deadline the shards may be gone; only a rebalance takes them back
+            self.valid_until = started + self.lease_ttl
+
+    def start_heartbeat(self):
+        def beat():
+            while not self._stop.wait(self.lease_ttl / 3):
+                try:
+                    self.renew()
+                except Exception as e:
+                    logging.error(f"Error renewing shard leases: {str(e)}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=beat, name="shard-lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def release(self):
+        """Stop heartbeating and hand every shard back for the other nodes to claim"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE shard_leases SET node_id = NULL, expires_at = NULL WHERE node_id = %s",
+                    (self.node_id,)
+                )
+                cur.execute("DELETE FROM poller_nodes WHERE node_id = %s", (self.node_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+        logging.info(f"Node {self.node_id} released {len(self.owned)} shards")
+        self.owned = frozenset()
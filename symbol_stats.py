@@ -0,0 +1,73 @@
+"""Competition-wide trade counts per symbol, maintained from per-account deltas.
+
+Every account's last reported symbol_trade_counts is kept as its contribution
+to the global totals. When a poll reports new counts only the difference is
+applied, so a cycle costs O(accounts that changed) and accounts that were
+skipped, breached or not due this tick keep counting. Contributions are only
+withdrawn when an account leaves the leaderboard altogether. They are stored
+next to the metadata row so a restart picks up where the last run left off.
+"""
+import heapq
+from operator import itemgetter
+
+# Symbols listed in the metadata's top_symbols ranking
+TOP_SYMBOLS = 10
+
+
+class GlobalSymbolStats:
+    def __init__(self, contributions=None):
+        self.contributions = {}  # account_id -> {symbol: trade count}
+        self.totals = {}         # symbol -> trade count over all contributions
+        self.dirty = False
+        for account_id, counts in (contributions or {}).items():
+            self.apply(account_id, counts)
+        self.dirty = False
+
+    def _add(self, symbol, delta):
+        total = self.totals.get(symbol, 0) + delta
+        if total:
+            self.totals[symbol] = total
+        else:
+            self.totals.pop(symbol, None)
+
+    def apply(self, account_id, counts):
+        """Replace an account's contribution, returns True if any total changed"""
+        account_id = str(account_id)
+        counts = {symbol: int(n) for symbol, n in counts.items() if int(n)}
+        previous = self.contributions.get(account_id, {})
+        if counts == previous:
+            return False
+        for symbol in previous.keys() | counts.keys():
+            delta = counts.get(symbol, 0) - previous.get(symbol, 0)
+            if delta:
+                self._add(symbol, delta)
+        if counts:
+            self.contributions[account_id] = counts
+        else:
+            self.contributions.pop(account_id, None)
+        self.dirty = True
+        return True
+
+    def retain(self, account_ids):
+        """Withdraw the contributions of accounts no longer on the leaderboard"""
+        account_ids = {str(account_id) for account_id in account_ids}
+        removed = [account_id for account_id in self.contributions if account_id not in account_ids]
+        for account_id in removed:
+            self.apply(account_id, {})
+        return removed
+
+    def top(self, n=TOP_SYMBOLS):
+        """The n most traded symbols as (symbol, count), most traded first"""
+        return heapq.nlargest(n, self.totals.items(), key=itemgetter(1))
+
+    def most_traded(self):
+        """The metadata table's most_traded document, or None before any trades"""
+        top = self.top()
+        if not top:
+            return None
+        return {
+            "most_traded_symbol": top[0][0],
+            "total_trades": top[0][1],
+            "global_trade_counts": dict(self.totals),
+            "top_symbols": [{"symbol": symbol, "total_trades": n} for symbol, n in top],
+        }
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from records import AccountResult
+from result_spool import ResultSpool
+
+
+def result(account_id, equity, breached):
+    polled_at = datetime(2025, 3, 3, 12, 0)
+    breaches = [{
+        "time": polled_at.isoformat(),
+        "type": "daily_drawdown",
+        "details": {"account_id": account_id, "equity": equity, "daily_dd_limit": 97000.0},
+    }] if breached else []
+    return AccountResult(
+        account_id=account_id, contestant_name="Alice", balance=equity, equity=equity,
+        profit_loss=equity - 100000, return_pct=0.0, lots_traded=1.0, average_lots=0.5,
+        most_traded_symbol="EURUSD", symbol_trade_counts={"EURUSD": 2}, total_trades=1,
+        winning_trades=0, losing_trades=1, win_rate=0.0, starting_day_balance=100000.0,
+        daily_dd_limit=97000.0, breaches=breaches, breached=breached, open_positions=0,
+        consistency_score=1.0, day_open_captured=False, polled_at=polled_at,
+    )
+
+
+class FlakySink:
+    def __init__(self):
+        self.down = True
+        self.recorded = []
+
+    def record(self, account_data_list):
+        if self.down:
+            raise ConnectionError("database down")
+        self.recorded.extend(data.account_id for data in account_data_list)
+        return []
+
+
+def test_breach_events_stay_spooled_until_stored(app, tmp_path, monkeypatch):
+    written = []
+    monkeypatch.setattr(app, "update_leaderboard_db", lambda batch, raise_errors=False: written.extend(batch))
+    sink = FlakySink()
+    spool = ResultSpool(str(tmp_path / "spool.jsonl"), fsync=False).open()
+    spool.append([result("1001", 96000.0, breached=True), result("1002", 101000.0, breached=False)])
+
+    def write(batch):
+        app.write_spooled(batch, sink)
+
+    # The leaderboard row isn't written ahead of its breach event
+    assert spool.drain(write) == 0
+    assert written == [] and spool.depth == 2
+    spool.close()
+
+    # Survives a restart and goes out with the next drain that reaches the database
+    spool = ResultSpool(str(tmp_path / "spool.jsonl"), fsync=False).open()
+    sink.down = False
+    assert spool.drain(write) == 2
+    assert sink.recorded == ["1001"]
+    assert sorted(data.account_id for data in written) == ["1001", "1002"]
+    spool.close()
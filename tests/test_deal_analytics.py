@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from benchmarks.deal_aggregation import scalar_aggregate, synthetic_deals
+from deal_aggregates import DealAggregate
+
+
+def totals(aggregate):
+    # json.dumps compares floats by their exact repr and dicts by key order
+    return json.dumps((
+        aggregate.total_lots, aggregate.winning_trades, aggregate.losing_trades,
+        aggregate.total_trades, aggregate.daily_profits, aggregate.symbol_trade_count,
+    ))
+
+
+@pytest.fixture(scope="module")
+def deals():
+    return synthetic_deals(5000)
+
+
+def test_single_fold_matches_scalar_loop(deals):
+    aggregate = DealAggregate(1)
+    assert aggregate.fold(deals) == len(deals)
+    assert totals(aggregate) == json.dumps(scalar_aggregate(deals))
+
+
+@pytest.mark.parametrize("chunks", [2, 7, 50])
+def test_chunked_folds_match_scalar_loop(deals, chunks):
+    aggregate = DealAggregate(1)
+    size = -(-len(deals) // chunks)
+    folded = sum(aggregate.fold(deals[start:start + size]) for start in range(0, len(deals), size))
+    assert folded == len(deals)
+    assert totals(aggregate) == json.dumps(scalar_aggregate(deals))
+
+
+def test_overlapping_folds_skip_deals_already_folded(deals):
+    # Every request reaches back before the cursor, like history_start's overlap
+    aggregate = DealAggregate(1)
+    folded = 0
+    for end in range(1000, len(deals) + 1000, 1000):
+        folded += aggregate.fold(deals[max(0, end - 1500):end])
+    assert folded == len(deals)
+    assert aggregate.last_deal_ticket == deals[-1].ticket
+    assert totals(aggregate) == json.dumps(scalar_aggregate(deals))
+
+
+def test_out_of_order_deals_fold_in_time_order(deals):
+    aggregate = DealAggregate(1)
+    aggregate.fold(tuple(reversed(deals[:2000])))
+    aggregate.fold(deals)
+    assert totals(aggregate) == json.dumps(scalar_aggregate(deals))
+
+
+def test_nothing_new_leaves_aggregate_clean(deals):
+    aggregate = DealAggregate(1)
+    aggregate.fold(deals)
+    aggregate.dirty = False
+    assert aggregate.fold(deals[-100:]) == 0
+    assert not aggregate.dirty
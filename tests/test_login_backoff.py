@@ -0,0 +1,33 @@
+from login_backoff import LoginBackoff
+from records import Account
+
+
+def account(password="secret"):
+    return Account("1001", "Broker-Demo", password, "Alice", False, 100000.0)
+
+
+def test_delay_doubles_up_to_the_cap():
+    backoff = LoginBackoff(base_delay=10, max_delay=35)
+    for failures, delay in [(1, 10), (2, 20), (3, 35), (4, 35)]:
+        backoff.record(account(), login_failed=True, now=0)
+        assert backoff.entries["1001"][1] == failures
+        assert backoff.blocked(account(), now=delay - 1)
+        assert not backoff.blocked(account(), now=delay)
+
+
+def test_successful_login_clears_the_backoff():
+    backoff = LoginBackoff(base_delay=10, max_delay=60)
+    backoff.record(account(), login_failed=True, now=0)
+    backoff.record(account(), login_failed=False, now=1)
+    assert not backoff.blocked(account(), now=2)
+    assert backoff.backed_off() == 0
+
+
+def test_new_credentials_are_tried_straight_away():
+    backoff = LoginBackoff(base_delay=10, max_delay=60)
+    backoff.record(account(), login_failed=True, now=0)
+    assert backoff.blocked(account(), now=1)
+    assert not backoff.blocked(account(password="fixed"), now=1)
+    # The failure count starts over for the new credentials
+    backoff.record(account(password="fixed"), login_failed=True, now=1)
+    assert backoff.entries["1001"][1] == 1
@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+from read_api import DETAIL_COLUMNS, LeaderboardSnapshot, SnapshotPublisher
+
+
+def rank_rows(count):
+    return {
+        str(1000 + n): (str(1000 + n), f"Trader {n}", n + 1, None, 0, None, 0, 100.0, 1.0, 100000.0, False, None)
+        for n in range(count)
+    }
+
+
+def test_pages_past_the_end_are_not_served_or_cached():
+    snapshot = LeaderboardSnapshot(rank_rows(120), {}, None)
+    body, _ = snapshot.page(3, 50)
+    assert [item["rank"] for item in json.loads(body)["items"]] == list(range(101, 121))
+    assert snapshot.page(4, 50) is None
+    assert snapshot.page(10 ** 9, 1) is None
+    assert list(snapshot.pages) == [(3, 50)]
+
+
+def test_an_empty_leaderboard_still_has_a_first_page():
+    snapshot = LeaderboardSnapshot({}, {}, None)
+    body, _ = snapshot.page(1, 50)
+    assert json.loads(body) == {"page": 1, "per_page": 50, "total": 0, "pages": 0, "items": []}
+    assert snapshot.page(2, 50) is None
+
+
+def leaderboard_row(account_id, equity, last_update_time):
+    row = {column: None for column in DETAIL_COLUMNS}
+    row.update(account_id=account_id, equity=equity, breached=True, last_update_time=last_update_time)
+    return row
+
+
+def test_seeded_rows_fill_in_accounts_not_polled_here():
+    publisher = SnapshotPublisher()
+    publisher.seed([leaderboard_row(1001, 96000.0, datetime(2025, 3, 3, 12, 0))])
+    publisher.publish(rank_rows(2), [], None)
+    row = json.loads(publisher.snapshot.page(1, 50)[0])["items"][1]
+    assert (row["account_id"], row["equity"], row["updated_at"]) == ("1001", 96000.0, "2025-03-03T12:00:00")
+    assert json.loads(publisher.snapshot.accounts["1001"][0])["equity"] == 96000.0
+
+
+def test_seeding_never_replaces_a_newer_result():
+    publisher = SnapshotPublisher()
+    publisher.seed([leaderboard_row("1001", 96000.0, datetime(2025, 3, 3, 12, 0))])
+    publisher.seed([leaderboard_row("1001", 95000.0, datetime(2025, 3, 3, 11, 0))])
+    assert publisher.details["1001"]["equity"] == 96000.0
+    publisher.seed([leaderboard_row("1001", 94000.0, datetime(2025, 3, 3, 13, 0))])
+    assert publisher.details["1001"]["equity"] == 94000.0
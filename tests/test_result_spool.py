@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from records import AccountResult
+from result_spool import ResultSpool
+
+
+def result(account_id, balance, polled_at):
+    return AccountResult(
+        account_id=account_id, contestant_name="Alice", balance=balance, equity=balance,
+        profit_loss=balance - 100000, return_pct=0.0, lots_traded=1.5, average_lots=0.75,
+        most_traded_symbol="EURUSD", symbol_trade_counts={"EURUSD": 2}, total_trades=1,
+        winning_trades=1, losing_trades=0, win_rate=100.0, starting_day_balance=100000.0,
+        daily_dd_limit=97000.0, breaches=[], breached=False, open_positions=0,
+        consistency_score=1.0, day_open_captured=False, polled_at=polled_at,
+    )
+
+
+def failing_write(results):
+    raise ConnectionError("database down")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "spool.jsonl")
+
+
+def test_unwritten_results_are_replayed_after_a_restart(path):
+    now = datetime(2025, 3, 3, 12, 0)
+    spool = ResultSpool(path, fsync=False).open()
+    spool.append([result("1001", 100500.0, now), result("1002", 99000.0, now)])
+    spool.append([result("1001", 100700.0, now + timedelta(minutes=1))])
+    assert spool.drain(failing_write) == 0
+    spool.close()
+
+    replayed = ResultSpool(path, fsync=False).open()
+    written = []
+    assert replayed.drain(written.extend) == 2
+    # Only the latest result of each account is kept
+    assert {data.account_id: data.balance for data in written} == {"1001": 100700.0, "1002": 99000.0}
+    assert {data.account_id: data.polled_at for data in written} == {"1001": now + timedelta(minutes=1), "1002": now}
+    assert replayed.depth == 0
+    replayed.close()
+    assert ResultSpool(path, fsync=False).open().depth == 0
+
+
+def test_torn_last_line_is_skipped(path):
+    spool = ResultSpool(path, fsync=False).open()
+    spool.append([result("1001", 100500.0, datetime(2025, 3, 3, 12, 0))])
+    spool.close()
+    with open(path, "a") as f:
+        f.write('{"account_id": "1002", "bal')
+
+    replayed = ResultSpool(path, fsync=False).open()
+    assert list(replayed.pending) == ["1001"]
+    replayed.close()
+
+
+def test_drain_drops_accounts_not_owned(path):
+    spool = ResultSpool(path, fsync=False).open()
+    now = datetime(2025, 3, 3, 12, 0)
+    spool.append([result("1001", 100500.0, now), result("1002", 99000.0, now)])
+    written = []
+    assert spool.drain(written.extend, owns=lambda account_id: account_id == "1001") == 1
+    assert [data.account_id for data in written] == ["1001"]
+    assert spool.depth == 0
+    spool.close()
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import pytest
+
+from competition import INITIAL_BALANCE
+from scheduler import (
+    ACTIVE_INTERVAL, AT_RISK_INTERVAL, DORMANT_AFTER_POLLS, DORMANT_INTERVAL, NEAR_BREACH_INTERVAL,
+    PollScheduler,
+)
+
+
+def result(equity, daily_dd_limit=INITIAL_BALANCE * 0.97, open_positions=0):
+    return SimpleNamespace(equity=equity, daily_dd_limit=daily_dd_limit, open_positions=open_positions)
+
+
+@pytest.mark.parametrize("data, idle_polls, interval", [
+    # Within 1% of the daily limit, with or without positions
+    (result(97_500), 0, NEAR_BREACH_INTERVAL),
+    (result(97_500), DORMANT_AFTER_POLLS, NEAR_BREACH_INTERVAL),
+    # Within 1% of the max drawdown even though the daily limit is far away
+    (result(95_800, daily_dd_limit=90_000), 0, NEAR_BREACH_INTERVAL),
+    # Within 3% and exposed
+    (result(99_000, open_positions=2), 0, AT_RISK_INTERVAL),
+    # Within 3% but flat
+    (result(99_000), 0, ACTIVE_INTERVAL),
+    (result(110_000, open_positions=1), DORMANT_AFTER_POLLS, ACTIVE_INTERVAL),
+    (result(110_000), DORMANT_AFTER_POLLS - 1, ACTIVE_INTERVAL),
+    (result(110_000), DORMANT_AFTER_POLLS, DORMANT_INTERVAL),
+])
+def test_interval_for(data, idle_polls, interval):
+    assert PollScheduler.interval_for(data, idle_polls) == interval
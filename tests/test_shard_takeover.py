@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from account_registry import AccountRegistry
+from deal_aggregates import DealAggregate
+from records import Account
+
+
+class FakeLeases:
+    shard_count = 4
+    valid = True
+    leader = True
+    owned = frozenset(range(4))
+
+    def rebalance(self):
+        # A node's first rebalance gains every shard it ends up with
+        return self.owned, frozenset()
+
+    def owns(self, account_id):
+        return True
+
+
+class FakeWorkers:
+    login_backoff = SimpleNamespace(blocked=lambda account: False)
+    account_timeout = 1
+
+    def __init__(self):
+        self.tasks = []
+
+    def iter_results(self, tasks):
+        self.tasks.extend(tasks)
+        return iter(())
+
+
+@pytest.fixture
+def cycle(app, monkeypatch):
+    stored = DealAggregate("1001", last_deal_time=1740000000, last_deal_ticket=7, deal_count=14)
+    monkeypatch.setattr(app, "load_deal_aggregates", lambda account_ids=None: {"1001": stored})
+    monkeypatch.setattr(app, "save_deal_aggregates", lambda aggregates: None)
+    monkeypatch.setattr(app, "sync_peer_results", lambda *args: 0)
+    registry = AccountRegistry(None)
+    registry.seed({"1001": Account("1001", "Broker-Demo", "secret", "Alice", False, 100000.0)})
+
+    def run(rebuild):
+        monkeypatch.setattr(app, "REBUILD_AGGREGATES", rebuild)
+        workers = FakeWorkers()
+        aggregates = {} if rebuild else {"1001": DealAggregate("1001")}
+        app.run_cycle(workers, registry, aggregates, app.PollerServices(leases=FakeLeases()))
+        (_, _, aggregate, _), = workers.tasks
+        return aggregate
+    return run
+
+
+def test_taken_over_accounts_resume_from_the_stored_cursor(cycle):
+    assert cycle(rebuild=False).deal_count == 14
+
+
+def test_rebuild_on_a_sharded_node_folds_the_full_history(cycle):
+    aggregate = cycle(rebuild=True)
+    assert (aggregate.last_deal_time, aggregate.deal_count) == (0, 0)
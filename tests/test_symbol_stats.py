@@ -0,0 +1,31 @@
+from symbol_stats import GlobalSymbolStats
+
+
+def test_apply_replaces_an_accounts_contribution():
+    stats = GlobalSymbolStats()
+    assert stats.apply(1, {"EURUSD": 4, "XAUUSD": 2})
+    assert stats.apply("2", {"EURUSD": 1})
+    assert stats.apply(1, {"EURUSD": 6, "GBPUSD": 1})
+    assert stats.totals == {"EURUSD": 7, "GBPUSD": 1}
+    assert stats.contributions == {"1": {"EURUSD": 6, "GBPUSD": 1}, "2": {"EURUSD": 1}}
+
+
+def test_unchanged_counts_are_not_dirty():
+    stats = GlobalSymbolStats({"1": {"EURUSD": 3}})
+    assert not stats.dirty
+    assert not stats.apply("1", {"EURUSD": 3})
+    assert not stats.dirty
+
+
+def test_retain_withdraws_removed_accounts():
+    stats = GlobalSymbolStats({"1": {"EURUSD": 3}, "2": {"EURUSD": 2, "USDJPY": 5}})
+    assert stats.retain(["1"]) == ["2"]
+    assert stats.totals == {"EURUSD": 3}
+    assert stats.dirty
+    assert stats.most_traded()["most_traded_symbol"] == "EURUSD"
+
+
+def test_no_trades_means_no_metadata():
+    stats = GlobalSymbolStats({"1": {"EURUSD": 0}})
+    assert stats.totals == {}
+    assert stats.most_traded() is None
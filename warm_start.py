@@ -0,0 +1,84 @@
+"""On-disk snapshot of the poller's state for a warm start.
+
+After every cycle the registry's accounts, the deal aggregates and the
+latest equity sample of every account are pickled to WARM_START_PATH. On
+startup a snapshot younger than WARM_START_MAX_AGE seeds the registry and
+aggregates, so the first cycle starts polling straight away while the
+database connection and the full loads happen in the background; the
+registry is refreshed from the database as soon as it is reachable.
+
+backfill.py deletes the snapshot before it rewrites the aggregates, so the
+next start loads the rebuilt ones from the database instead.
+
+The snapshot holds the MT5 passwords of every account, so it is written
+readable by the owner only. Set WARM_START_PATH to an empty string to turn
+it off.
+"""
+import logging
+import os
+import pickle
+import time
+
+WARM_START_PATH = os.getenv("WARM_START_PATH", "warm_start.pickle")
+# Seconds after which a snapshot is considered too stale to poll from
+WARM_START_MAX_AGE = float(os.getenv("WARM_START_MAX_AGE", "3600"))
+SNAPSHOT_VERSION = 1
+
+
+class WarmStart:
+    def __init__(self, accounts, aggregates, last_samples, saved_at):
+        self.accounts = accounts          # account_id -> Account
+        self.aggregates = aggregates      # account_id -> DealAggregate
+        self.last_samples = last_samples  # account_id -> (ts, equity)
+        self.saved_at = saved_at
+
+
+def save_snapshot(registry, aggregates, equity_store=None, path=None):
+    """Atomically replace the snapshot with the current state"""
+    path = WARM_START_PATH if path is None else path
+    if not path:
+        return
+    state = (
+        SNAPSHOT_VERSION,
+        time.time(),
+        registry.accounts,
+        aggregates,
+        equity_store.last_samples if equity_store is not None else {},
+    )
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def discard_snapshot(path=None):
+    """Delete the snapshot so the next start is a cold one, returns whether there was one"""
+    path = WARM_START_PATH if path is None else path
+    if not path:
+        return False
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def load_snapshot(path=None, max_age=None):
+    """The saved WarmStart, or None when there is no usable snapshot"""
+    path = WARM_START_PATH if path is None else path
+    max_age = WARM_START_MAX_AGE if max_age is None else max_age
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            version, saved_at, accounts, aggregates, last_samples = pickle.load(f)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable warm-start snapshot {path}: {str(e)}")
+        return None
+    age = time.time() - saved_at
+    if version != SNAPSHOT_VERSION or age > max_age:
+        logging.info(f"Ignoring warm-start snapshot {path} ({age:.0f}s old, version {version})")
+        return None
+    logging.info(f"Warm start from {path}: {len(accounts)} accounts, {len(aggregates)} aggregates, {age:.0f}s old")
+    return WarmStart(accounts, aggregates, last_samples, saved_at)